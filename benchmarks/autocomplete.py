@@ -0,0 +1,68 @@
+"""Time fighter autocomplete against a mid-game player's eligibility.
+
+Run with `python -m benchmarks.autocomplete` from the repository root.
+Every prefix of every fighter name and alias is completed, along with random strings,
+first with an empty cache and then with a warm one.
+"""
+from types import SimpleNamespace
+import statistics
+import random
+import string
+import time
+
+import discord
+
+from cogs.smash.cog import fighter_choices
+from cogs.smash.models import Fighter, Game, MODES
+
+BUDGET = 1000  # µs
+
+
+def mid_game_player(rounds=30, bans=3):
+    cog = SimpleNamespace(bot=SimpleNamespace(loop=None))
+    game = Game(cog, None, MODES['elimination'], [discord.Object(n) for n in range(3)], 0, None, None)
+    fighters = list(Fighter.all())
+    for player in game.players.values():
+        for fighter in random.sample(fighters, rounds):
+            player.play(fighter)
+    for fighter in random.sample(fighters, bans):
+        game.player_list[0].ban(fighter)
+    return game.player_list[0]
+
+
+def queries(randoms=2000):
+    texts = []
+    for fighter in Fighter.all():
+        for name in (fighter.name, *fighter.aliases, fighter.number):
+            texts.extend(name[:i] for i in range(len(name) + 1))
+    alphabet = string.ascii_lowercase + ' .-'
+    texts.extend(''.join(random.choices(alphabet, k=random.randint(1, 12))) for _ in range(randoms))
+    return texts
+
+
+def run(texts, check):
+    times = []
+    for text in texts:
+        start = time.perf_counter()
+        fighter_choices(text, check)
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    return statistics.mean(times), times[int(len(times) * 0.99)], times[-1]
+
+
+def main():
+    random.seed(0)
+    player = mid_game_player()
+    texts = queries()
+    print(f'{len(texts)} queries, {len(player.eligible)} eligible fighters')
+    Fighter._completions.cache_clear()
+    worst = 0
+    for label in ('cold', 'warm'):
+        mean, p99, most = run(texts, player.eligible.__contains__)
+        worst = max(worst, p99)
+        print(f'{label}: mean {mean:.1f}µs, p99 {p99:.1f}µs, max {most:.1f}µs')
+    print('ok' if worst < BUDGET else f'p99 over {BUDGET}µs budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Time stats and rating queries on a match history of tens of thousands of rounds.
+
+Run with `python -m benchmarks.history` from the repository root.
+"""
+from types import SimpleNamespace
+import statistics
+import tempfile
+import datetime
+import asyncio
+import random
+import time
+import os
+
+import discord
+
+from cogs.smash.models import Fighter, Game, EndReason, MODES
+from cogs.smash.history import MatchHistory
+
+GAMES = 2000
+MEMBERS = 40
+BUDGET = 100  # ms, well inside an interaction's 3 seconds
+
+
+def make_game(cog, guild, n):
+    channel = SimpleNamespace(id=1, guild=guild)
+    members = [discord.Object(m) for m in random.sample(range(MEMBERS), random.randint(2, 4))]
+    started = discord.utils.utcnow() - datetime.timedelta(minutes=30)
+    game = Game(cog, None, MODES['smash'], members, 0, None, started)
+    game.channel = channel
+    fighters = list(Fighter.all())
+    for _ in range(random.randint(5, 25)):
+        winner = random.choice(game.player_list)
+        for player in game.player_list:
+            player.play(random.choice(fighters))
+            if player is winner:
+                player.win()
+    return game
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return (time.perf_counter() - start) * 1000
+
+
+async def main():
+    random.seed(0)
+    loop = asyncio.get_running_loop()
+    guild = SimpleNamespace(id=1)
+    cog = SimpleNamespace(bot=SimpleNamespace(loop=loop))
+    with tempfile.TemporaryDirectory() as tmp:
+        history = MatchHistory(loop, os.path.join(tmp, 'history.sqlite3'))
+        rounds = 0
+        record_times = []
+        for n in range(GAMES):
+            game = make_game(cog, guild, n)
+            rounds += sum(len(p.rounds) for p in game.player_list)
+            record_times.append(await timed(history.record(game, EndReason.win)))
+        print(f'{GAMES} games, {rounds} player rounds, '
+              f'recorded in {statistics.mean(record_times):.2f}ms on average')
+        names = [f.name for f in Fighter.all()]
+        queries = {
+            'fighter win rates': lambda: history.fighter_stats(guild.id),
+            'one fighter': lambda: history.fighter_stats(guild.id, random.choice(names)),
+            'most played': lambda: history.most_played(guild.id, random.randrange(MEMBERS)),
+            'head to head': lambda: history.head_to_head(guild.id, *random.sample(range(MEMBERS), 2)),
+        }
+        worst = 0
+        for label, query in queries.items():
+            times = sorted([await timed(query()) for _ in range(200)])
+            worst = max(worst, times[-1])
+            print(f'{label}: mean {statistics.mean(times):.2f}ms, max {times[-1]:.2f}ms')
+        ratings = await history.load_ratings()
+        board = ratings.board(guild.id)
+        times = sorted([await timed(asyncio.sleep(0, board.rank(random.randrange(MEMBERS)))) for _ in range(200)])
+        print(f'rank: mean {statistics.mean(times):.3f}ms, leaderboard of {len(board)} members')
+        print(f'rating recompute: {await timed(history.recompute_ratings()):.0f}ms')
+        history.close()
+    print('ok' if worst < BUDGET else f'over {BUDGET}ms budget')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
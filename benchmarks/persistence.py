@@ -0,0 +1,69 @@
+"""Measure write amplification of `GameStore` under bursty play.
+
+Run with `python -m benchmarks.persistence` from the repository root.
+Games take bursts of commands, each marking its game dirty like `Game.update` does,
+and the rows, transactions and bytes written are compared with saving a full snapshot on every command.
+"""
+from types import SimpleNamespace
+import datetime
+import tempfile
+import asyncio
+import random
+import json
+import os
+
+import discord
+
+from cogs.smash.models import Fighter, Game, MODES
+from cogs.smash.store import GameStore
+
+GAMES = 20
+COMMANDS = 2000
+BURST = (1, 6)  # commands per burst
+PAUSE = (0, 0.02)  # seconds between bursts
+INTERVAL = 0.1  # store interval, scaled down with the pauses
+
+
+def make_game(cog, n):
+    channel = SimpleNamespace(id=n, guild=SimpleNamespace(id=0))
+    members = [discord.Object(n * 10 + i) for i in range(3)]
+    game = Game(cog, None, MODES['smash'], members, 0, None, datetime.datetime.now())
+    game.channel = channel
+    game.message = SimpleNamespace(id=n)
+    return game
+
+
+async def main():
+    random.seed(0)
+    loop = asyncio.get_running_loop()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = GameStore(loop, os.path.join(tmp, 'games.sqlite3'), interval=INTERVAL)
+        cog = SimpleNamespace(bot=SimpleNamespace(loop=loop), store=store)
+        games = [make_game(cog, n) for n in range(GAMES)]
+        fighters = list(Fighter.all())
+        eager_bytes = commands = 0
+        while commands < COMMANDS:
+            game = random.choice(games)
+            for _ in range(random.randint(*BURST)):
+                player = random.choice(list(game.players.values()))
+                if random.random() < 0.7:
+                    player.play(random.choice(fighters))
+                else:
+                    player.win()
+                store.mark(game)
+                snapshot = {**game.to_dict(), 'log': game.log_entries()}
+                eager_bytes += len(json.dumps(snapshot, separators=(',', ':')))
+                commands += 1
+            await asyncio.sleep(random.uniform(*PAUSE))
+        await store.flush()
+        store.close()
+    print(f'{commands} commands on {GAMES} games, written every {INTERVAL}s')
+    print(f'write-behind: {store.rows_written} rows in {store.transactions} transactions, '
+          f'{store.bytes_written / 1024:.0f} KiB')
+    print(f'per command: {store.rows_written / commands:.3f} rows, {store.transactions / commands:.3f} transactions, '
+          f'{store.bytes_written / commands:.0f} bytes')
+    print(f'write per command: 1 row, 1 transaction, {eager_bytes / commands:.0f} bytes')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
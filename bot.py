@@ -2,8 +2,6 @@
 import logging
 import sys
 
-from discord.ext import commands
-
 from lagbot import LagBot
 
 # stolen from R.Danny
@@ -19,14 +17,7 @@ logging.basicConfig(level=logging.WARNING)
 initial_cogs = ['cogs.help', 'cogs.meta', 'cogs.smash', 'jishaku']
 
 if __name__ == '__main__':
-    bot = LagBot()
-
-    for cog in initial_cogs:
-        try:
-            bot.load_extension(cog)
-        except commands.ExtensionError:
-            logging.exception(f"Couldn't load cog {cog}")
-
+    bot = LagBot(initial_cogs=initial_cogs)
     status = bot.run()
     logging.critical(f'Exiting with {status}.')
     logging.shutdown()
@@ -171,7 +171,7 @@ class HelpView(ui.View):
         await interaction.response.edit_message(embed=embed, view=self)
 
     @ui.select(placeholder='Categories')
-    async def cog_select(self, select: ui.Select, interaction: Interaction):
+    async def cog_select(self, interaction: Interaction, select: ui.Select):
         name = select.values[0]
         entity = self.bot.get_cog(name)
         if entity == self.entity:
@@ -182,7 +182,7 @@ class HelpView(ui.View):
         await self.respond_with_edit(interaction)
 
     @ui.select(placeholder='Commands')
-    async def command_select(self, select: ui.Select, interaction: Interaction):
+    async def command_select(self, interaction: Interaction, select: ui.Select):
         name = select.values[0]
         entity = self.bot.get_command(name)
         if entity == self.entity:
@@ -193,7 +193,7 @@ class HelpView(ui.View):
         await self.respond_with_edit(interaction)
 
     @ui.button(label='Up', style=ButtonStyle.blurple)
-    async def up_level(self, button: ui.Button, interaction: Interaction):
+    async def up_level(self, interaction: Interaction, button: ui.Button):
         if isinstance(self.entity, Command):
             self.entity = self.entity.parent or self.entity.cog or None
         elif isinstance(self.entity, Cog):
@@ -204,7 +204,7 @@ class HelpView(ui.View):
         await self.respond_with_edit(interaction)
 
     @ui.button(label='Close', style=ButtonStyle.danger)
-    async def close(self, button: ui.Button, interaction: Interaction):
+    async def close(self, interaction: Interaction, button: ui.Button):
         self.stop()
         await interaction.message.delete()
 
@@ -220,5 +220,5 @@ class Help(Cog):
         self.bot.help_command = self.original_help_command
 
 
-def setup(bot):
-    bot.add_cog(Help(bot))
\ No newline at end of file
+async def setup(bot):
+    await bot.add_cog(Help(bot))
\ No newline at end of file
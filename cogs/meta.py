@@ -1,6 +1,7 @@
 from discord.ext import commands
 import discord
 
+from utils import pluralize
 import config
 
 
@@ -22,7 +23,7 @@ class Meta(commands.Cog):
             await ctx.send('Invalid exit code.')
             return
         self.bot.exit_status = code
-        await self.bot.logout()
+        await self.bot.close()
 
     @commands.group(hidden=True)
     @commands.is_owner()
@@ -59,6 +60,13 @@ class Meta(commands.Cog):
                 new_avatar = await ctx.message.attachments[0].read()
             await self.bot.user.edit(avatar=new_avatar)
 
+    @manage.command()
+    @commands.is_owner()
+    async def sync(self, ctx):
+        """Sync application commands with Discord."""
+        synced = await self.bot.tree.sync()
+        await ctx.send(f'Synced {pluralize("application command", "application commands", len(synced))}.')
+
     @property
     def oauth_url(self):
         perms = discord.Permissions()
@@ -101,5 +109,5 @@ class Meta(commands.Cog):
         await ctx.send(f'Pong! Latency: {int(self.bot.latency * 1000)}ms')
 
 
-def setup(bot):
-    bot.add_cog(Meta(bot))
+async def setup(bot):
+    await bot.add_cog(Meta(bot))
@@ -1,5 +1,5 @@
 from .cog import Smash
 
 
-def setup(bot):
-    bot.add_cog(Smash(bot))
+async def setup(bot):
+    await bot.add_cog(Smash(bot))
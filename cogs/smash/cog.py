@@ -1,7 +1,11 @@
-import random
+import functools
+import logging
 import typing
+import re
 
+from discord.ext.commands.view import StringView
 from discord.ext import commands
+from discord import app_commands
 import discord
 
 from .models import (Fighter, FakeFighter,
@@ -9,11 +13,39 @@ from .models import (Fighter, FakeFighter,
                      MODES, inject_help_modes,
                      SmashError,
                      FighterMenu, FighterPageSource,
-                     GameView)
-from utils import commaize, clamp
+                     GameView, ActivityView, Components, FakeContext, Deadlines,
+                     GameRegistry, DeleteBatcher)
+from .history import MatchHistory
+from .ratings import OVERALL
+from .matchups import Matchups
+from .store import GameStore
+from utils import commaize, clamp, pluralize
+import config
 
 
 _NAME, *_ALIASES = MODES.keys()
+MENTION = re.compile(r'<@!?([0-9]+)>')
+LEADERBOARD_SIZE = 10
+MATCHUPS_SHOWN = 5
+MIN_MATCHUP_ROUNDS = 5
+
+
+def fighter_choices(text, check=None):
+    """Autocomplete choices for the fighters matching `text` that pass `check`."""
+    return [app_commands.Choice(name=f'{f.number}. {f.name}', value=f.name)
+            for f in Fighter.autocomplete(text, check)]
+
+
+def serialized(func):
+    """Run a game command on its game's command queue, after every command sent before it."""
+    @functools.wraps(func)
+    async def wrapper(self, ctx, *args, **kwargs):
+        return await ctx.player.game.run(func, self, ctx, *args, **kwargs)
+    return wrapper
+
+
+def win_rate(played, won):
+    return f'{won / played:.0%}'
 
 
 def game_in_progress(*, player_active=True):
@@ -30,11 +62,56 @@ def game_in_progress(*, player_active=True):
 class Smash(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.players = {}  # {member: Player}
+        self.games = GameRegistry()
+        self.timers = Deadlines(bot.loop, lambda game: game.on_inactive())  # inactivity of each Game
+        self.confirmations = {}  # {message ID: Game} for inactivity confirmations
+        self.deleter = DeleteBatcher(bot.loop)  # for `delete_commands`
+        self.game_view = None  # see `register_views`
+        self.activity_view = None
+        self.game_components = None  # sent on boards, see `Components`
+        self.activity_components = None
+        self.store = GameStore(bot.loop)
+        self.history = MatchHistory(bot.loop)
+        self.matchups = Matchups(bot.loop, self.history, [f.name for f in Fighter.all()])
+        bot.loop.create_task(self.register_views())
+        bot.loop.create_task(self.restore_games())
         self.short_commands = short = (self.pick, self.ban, self.unban, self.win, self.undo, self.change)
+        self.short_dispatch = {name: cmd for cmd in short for name in (cmd.name, *cmd.aliases)}
         self.delete_commands = (*short, *self.change.commands,
                                 self.end, self.repost, self.add, self.leave, self.rejoin)
 
+    @property
+    def players(self):
+        """{member: Player} for every live game."""
+        return self.games.players
+
+    async def register_views(self):
+        """Create the views shared by every game and register them to handle components on any message.
+
+        Views must be created in a coroutine.
+        """
+        self.game_view = GameView(self.games, self.bot)
+        self.activity_view = ActivityView(self.confirmations)
+        self.bot.add_view(self.game_view)
+        self.bot.add_view(self.activity_view)
+        self.game_components = Components(self.game_view)
+        self.activity_components = Components(self.activity_view)
+
+    async def restore_games(self):
+        """Restore the games saved by `store` and reattach them to their boards."""
+        await self.bot.wait_until_ready()
+        for data, entries in await self.store.load():
+            try:
+                game = Game.from_dict(self, data, entries)
+            except (KeyError, ValueError):
+                logging.exception(f'Failed to restore game {data.get("id")}.')
+                game = None
+            if game is None or not game.players or any(m in self.players for m in game.players):
+                self.store.discard(data['id'])
+                continue
+            self.games.add(game)
+            game.restart_timer()
+
     @commands.command()
     async def fighters(self, ctx):
         """List all fighters in a neat menu."""
@@ -46,14 +123,107 @@ class Smash(commands.Cog):
         menu = FighterMenu(source)
         await menu.start(ctx)
 
+    @commands.group(invoke_without_command=True)
+    async def stats(self, ctx, member: discord.Member = None):
+        """Show a member's most played fighters in this server."""
+        member = member or ctx.author
+        rows = await self.history.most_played(ctx.guild.id, member.id)
+        if not rows:
+            await ctx.send(f'{member.display_name} has no recorded rounds.')
+            return
+        lines = [f'{fighter}: {played} played, {win_rate(played, won)} won' for fighter, played, won in rows]
+        embed = discord.Embed(title=f'Most played by {member.display_name}', description='\n'.join(lines))
+        await ctx.send(embed=embed)
+
+    @stats.command(name='fighters', aliases=['fighter', 'f'])
+    async def stats_fighters(self, ctx, *, fighter: Fighter = None):
+        """Show fighter win rates in this server, or a single fighter's."""
+        rows = await self.history.fighter_stats(ctx.guild.id, fighter and fighter.name)
+        if not rows:
+            await ctx.send('No recorded rounds.')
+            return
+        paginator = commands.Paginator(prefix='', suffix='')
+        for name, played, won in rows:
+            paginator.add_line(f'{name}: {win_rate(played, won)} of {pluralize("round", "rounds", played)} won')
+        for page in paginator.pages:
+            await ctx.send(page)
+
+    @stats.command(name='versus', aliases=['vs', 'h2h'])
+    async def stats_versus(self, ctx, member: discord.Member, opponent: discord.Member = None):
+        """Show the record of rounds two members played together, you against `member` by default."""
+        if opponent is None:
+            member, opponent = ctx.author, member
+        rounds, won, lost = await self.history.head_to_head(ctx.guild.id, member.id, opponent.id)
+        if not rounds:
+            await ctx.send(f'{member.display_name} and {opponent.display_name} have no recorded rounds together.')
+            return
+        await ctx.send(f'**{member.display_name}** {won} - {lost} **{opponent.display_name}** '
+                       f'over {pluralize("round", "rounds", rounds)}')
+
+    @commands.command()
+    async def leaderboard(self, ctx, *, fighter: Fighter = None):
+        """Show the highest rated members in this server, overall or playing a fighter."""
+        ratings = await self.history.load_ratings()
+        top = ratings.board(ctx.guild.id, fighter.name if fighter else OVERALL).top(LEADERBOARD_SIZE)
+        if not top:
+            await ctx.send('No rated rounds.')
+            return
+        lines = []
+        for number, (member_id, rating) in enumerate(top, 1):
+            member = ctx.guild.get_member(member_id)
+            lines.append(f'{number}. {member.display_name if member else member_id}: {rating:.0f}')
+        title = f'{fighter} Leaderboard' if fighter else 'Leaderboard'
+        await ctx.send(embed=discord.Embed(title=title, description='\n'.join(lines)))
+
+    @commands.command()
+    async def rank(self, ctx, member: typing.Optional[discord.Member] = None, *, fighter: Fighter = None):
+        """Show a member's rating and rank in this server, overall or playing a fighter."""
+        member = member or ctx.author
+        ratings = await self.history.load_ratings()
+        board = ratings.board(ctx.guild.id, fighter.name if fighter else OVERALL)
+        playing = f' playing {fighter}' if fighter else ''
+        rank = board.rank(member.id)
+        if rank is None:
+            await ctx.send(f'{member.display_name} has no rated rounds{playing}.')
+            return
+        await ctx.send(f'**{member.display_name}** is ranked {rank} of {len(board)}{playing}, '
+                       f'rated {board.get(member.id):.0f} over '
+                       f'{pluralize("round", "rounds", board.rounds[member.id])}.')
+
+    @commands.command(name='matchups')
+    async def fighter_matchups(self, ctx, *, fighter: Fighter):
+        """Show a fighter's best and worst matchups over every recorded round."""
+        async with ctx.typing():
+            rows = await self.matchups.against(fighter.index)
+        rows = [(Fighter.from_code(i), won, played) for i, won, played in rows if played >= MIN_MATCHUP_ROUNDS]
+        if not rows:
+            await ctx.send(f'Not enough recorded rounds with {fighter}.')
+            return
+        rows.sort(key=lambda row: row[1] / row[2], reverse=True)
+        embed = discord.Embed(title=f'{fighter} Matchups', color=fighter.color)
+        for name, shown in (('Best', rows[:MATCHUPS_SHOWN]), ('Worst', rows[:-MATCHUPS_SHOWN - 1:-1])):
+            lines = [f'{opponent}: {win_rate(played, won)} of {played}' for opponent, won, played in shown]
+            embed.add_field(name=name, value='\n'.join(lines))
+        await ctx.send(embed=embed)
+
+    @commands.command(name='recomputeratings', hidden=True)
+    @commands.is_owner()
+    async def recompute_ratings(self, ctx):
+        """Rebuild every rating from the match history."""
+        count = await self.history.recompute_ratings()
+        await ctx.send(f'Recomputed {pluralize("rating", "ratings", count)}.')
+
     @commands.command(aliases=['p'])
     @game_in_progress()
+    @serialized
     async def pick(self, ctx, round_num: typing.Optional[int] = None, *, fighter=''):
         """Pick a fighter to play in a given round."""
         player = ctx.player
         game = player.game
         if fighter in ('', 'rand', 'random'):
-            fighter = random.choice([f for f in Fighter.all() if game.mode.pick_check(player, f)])
+            if not player.eligible:
+                raise SmashError('There are no fighters left for you to pick.')
+            fighter = player.eligible.choice()
         elif fighter in FakeFighter.names:
             fighter = FakeFighter(fighter)
         else:
@@ -69,6 +239,7 @@ class Smash(commands.Cog):
 
     @commands.command(aliases=['b'])
     @game_in_progress()
+    @serialized
     async def ban(self, ctx, *, fighter: Fighter):
         """Ban a fighter for everyone playing."""
         player = ctx.player
@@ -81,6 +252,7 @@ class Smash(commands.Cog):
 
     @commands.command(aliases=['ub'])
     @game_in_progress()
+    @serialized
     async def unban(self, ctx, *, fighter: Fighter):
         """Unban a fighter you have banned.
 
@@ -94,6 +266,7 @@ class Smash(commands.Cog):
 
     @commands.command(aliases=['w'])
     @game_in_progress()
+    @serialized
     async def win(self, ctx, round_num: int = 0):
         """Mark a round as won by you."""
         player = ctx.player
@@ -107,6 +280,7 @@ class Smash(commands.Cog):
 
     @commands.command(aliases=['u'])
     @game_in_progress()
+    @serialized
     async def undo(self, ctx, round_num: typing.Optional[int] = None, action='p'):
         """Undo round actions such as playing or winning."""
         action = {'p': 'play', 'play': 'play', 'w': 'win', 'win': 'win'}.get(action, None)
@@ -127,6 +301,7 @@ class Smash(commands.Cog):
 
     @change.command(aliases=['w', 'win'])
     @game_in_progress()
+    @serialized
     async def wins(self, ctx, number: int):
         """Change number of wins required to end the game.
 
@@ -141,6 +316,7 @@ class Smash(commands.Cog):
 
     @change.command(aliases=['m', 'gamemode'])
     @game_in_progress()
+    @serialized
     async def mode(self, ctx, mode):
         """Change the gamemode.
 
@@ -155,6 +331,7 @@ class Smash(commands.Cog):
 
     @change.command(aliases=['b', 'maxbans'])
     @game_in_progress()
+    @serialized
     async def bans(self, ctx, number: int):
         """Change the allowed number of bans.
 
@@ -167,6 +344,7 @@ class Smash(commands.Cog):
 
     @change.command(aliases=['a', 'id'])
     @game_in_progress()
+    @serialized
     async def arena(self, ctx, arena_id: typing.Optional[arena_id]):
         """Change, set, or remove the arena ID."""
         game = ctx.player.game
@@ -175,12 +353,16 @@ class Smash(commands.Cog):
 
     @commands.command()
     @game_in_progress()
+    @serialized
     async def repost(self, ctx, channel: discord.TextChannel = None):
         """Repost the game embed to this, or another, channel."""
-        await ctx.player.game.update(destination=channel or ctx)
+        game = ctx.player.game
+        await game.update(destination=channel or ctx)
+        self.games.move(game)
 
     @commands.command()
     @game_in_progress()
+    @serialized
     async def end(self, ctx):
         """Vote to end the game. Requires majority vote to succeed."""
         game = ctx.player.game
@@ -227,15 +409,21 @@ class Smash(commands.Cog):
         ,leave             | leave the game
         ,rejoin            | rejoin a game after leaving
         """
-        if ctx.author not in players:
-            players = (ctx.author, *players)
+        try:
+            await self.start_game(ctx, ctx.author, players, MODES[ctx.invoked_with],
+                                  arena_id, winning_score, max_bans, ctx.message.created_at)
+        except SmashError as e:
+            await ctx.send(e, delete_after=5)
+
+    async def start_game(self, destination, author, players, mode, arena_id, winning_score, max_bans, created_at):
+        """Start a game and post its board to `destination`, raising `SmashError` if it can't start."""
+        if author not in players:
+            players = (author, *players)
         count = len(players)
         if count == 1:
-            await ctx.send('Not enough players to start a game.')
-            return
+            raise SmashError('Not enough players to start a game.')
         elif count > 25:
-            await ctx.send('Too many players to start a game. Limit of 25 players.')
-            return
+            raise SmashError('Too many players to start a game. Limit of 25 players.')
         if winning_score is None:
             winning_score = 0
         else:
@@ -243,17 +431,148 @@ class Smash(commands.Cog):
         already_in_game = [p for p in players if p in self.players]
         if already_in_game:
             if len(already_in_game) == 1:
-                await ctx.send(f'{already_in_game[0].mention} is already in a game.', delete_after=5)
-            else:
-                await ctx.send(f'{commaize(m.mention for m in already_in_game)} are already in a game.', delete_after=5)
+                raise SmashError(f'{already_in_game[0].mention} is already in a game.')
+            raise SmashError(f'{commaize(m.mention for m in already_in_game)} are already in a game.')
+        game = Game(self, arena_id, mode, players, winning_score, max_bans, created_at)
+        self.games.add(game)
+        await game.update(destination=destination, view=self.game_components)
+        self.games.move(game)
+        return game
+
+    slash = app_commands.Group(name='smash', description='Play a smash match.', guild_only=True)
+
+    def slash_player(self, interaction):
+        """Return the interaction user's player, if they're playing a game in this channel."""
+        player = self.players.get(interaction.user)
+        if player is None or not player.active or player.game._ending:
+            raise SmashError('You are not playing in a game.')
+        if player.game.channel != interaction.channel:
+            raise SmashError(f'Your game is in {player.game.channel.mention}.')
+        return player
+
+    async def invoke_slash(self, interaction, command, *args, **kwargs):
+        """Invoke a game command for the interaction user, answering with any error privately."""
+        ctx = FakeContext(interaction, None)
+        try:
+            ctx.player = self.slash_player(interaction)
+            if ctx.player.game.busy:  # the command would wait for others, past Discord's deadline
+                await interaction.response.defer(ephemeral=True)
+            await command(ctx, *args, **kwargs)
+        except SmashError as e:
+            await ctx.send(str(e))
+            return
+        if not ctx.replied:
+            await ctx.send('\N{WHITE HEAVY CHECK MARK}')
+
+    @slash.command(name='start')
+    @app_commands.describe(mode='Which fighters each player may pick',
+                           players='Mention everyone playing with you',
+                           winning_score='Wins needed to end the game, none by default',
+                           max_bans='Number of bans each player may have, unlimited by default',
+                           arena='Arena ID of the game')
+    @app_commands.choices(mode=[app_commands.Choice(name=m.name, value=key) for key, m in MODES.items()])
+    async def slash_start(self, interaction: discord.Interaction,
+                          mode: app_commands.Choice[str],
+                          players: str,
+                          winning_score: int = None,
+                          max_bans: int = None,
+                          arena: str = None):
+        """Start a smash match."""
+        members = (interaction.guild.get_member(int(id_)) for id_ in MENTION.findall(players))
+        members = list(dict.fromkeys(m for m in members if m is not None))
+        try:
+            if arena is not None:
+                arena = arena_id(arena)
+            await self.start_game(interaction.channel, interaction.user, members, MODES[mode.value],
+                                  arena, winning_score, max_bans, interaction.created_at)
+        except (SmashError, ValueError) as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+        else:
+            await interaction.response.send_message('Game started.', ephemeral=True)
+
+    @slash.command(name='pick')
+    @app_commands.describe(fighter='Fighter to play, random if omitted', round='Round to insert the fighter at')
+    async def slash_pick(self, interaction: discord.Interaction, fighter: str = '', round: int = None):
+        """Pick a fighter to play in a given round."""
+        await self.invoke_slash(interaction, self.pick, round, fighter=fighter)
+
+    @slash.command(name='ban')
+    @app_commands.describe(fighter='Fighter to ban')
+    async def slash_ban(self, interaction: discord.Interaction, fighter: str):
+        """Ban a fighter for everyone playing."""
+        try:
+            fighter = Fighter.get_closest(fighter)
+        except SmashError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
             return
-        mode = MODES[ctx.invoked_with]
-        game = Game(ctx, arena_id, mode, players, winning_score, max_bans, ctx.message.created_at)
-        self.players.update(game.players)
-        await game.update(destination=ctx, view=GameView(game))
+        await self.invoke_slash(interaction, self.ban, fighter=fighter)
+
+    @slash.command(name='unban')
+    @app_commands.describe(fighter='Fighter to unban')
+    async def slash_unban(self, interaction: discord.Interaction, fighter: str):
+        """Unban a fighter you have banned."""
+        try:
+            fighter = Fighter.get_closest(fighter)
+        except SmashError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+        await self.invoke_slash(interaction, self.unban, fighter=fighter)
+
+    @slash_pick.autocomplete('fighter')
+    async def pick_autocomplete(self, interaction: discord.Interaction, current: str):
+        player = self.players.get(interaction.user)
+        if player is None:
+            return []
+        return fighter_choices(current, player.eligible.__contains__)
+
+    @slash_ban.autocomplete('fighter')
+    async def ban_autocomplete(self, interaction: discord.Interaction, current: str):
+        player = self.players.get(interaction.user)
+        if player is None:
+            return []
+        ban_check = player.game.mode.ban_check
+        return fighter_choices(current, lambda f: ban_check(player, f))
+
+    @slash_unban.autocomplete('fighter')
+    async def unban_autocomplete(self, interaction: discord.Interaction, current: str):
+        player = self.players.get(interaction.user)
+        if player is None:
+            return []
+        return fighter_choices(current, player.banned.__contains__)
+
+    @commands.command(name='livegames', hidden=True)
+    @commands.is_owner()
+    async def live_games(self, ctx):
+        """List live games in each guild."""
+        paginator = commands.Paginator(prefix='', suffix='')
+        paginator.add_line(f'{pluralize("live game", "live games", len(self.games))}, '
+                           f'{pluralize("pending deadline", "pending deadlines", len(self.timers))}')
+        sizes = self.deleter.batch_sizes
+        batches = sum(sizes.values())
+        if batches:
+            paginator.add_line(f'Bulk deletes: {batches}, '
+                               f'{sum(n * count for n, count in sizes.items()) / batches:.1f} messages on average, '
+                               f'at most {max(sizes)}')
+        paginator.add_line(f'Single deletes: {self.deleter.single_deletes}')
+        store = self.store
+        paginator.add_line(f'Saves: {store.marks} requested, {store.rows_written} rows written '
+                           f'in {pluralize("transaction", "transactions", store.transactions)}')
+        lookups = Fighter.cache_info()
+        paginator.add_line(f'Fighter lookups: {lookups.hits} cached, {lookups.misses} uncached')
+        for guild_id, games in self.games.guilds.items():
+            guild = self.bot.get_guild(guild_id)
+            paginator.add_line(f'\n**{guild or guild_id}**: {len(games)}')
+            for game in games:
+                paginator.add_line(f'{game.channel.mention} - {game.mode.name}, '
+                                   f'{pluralize("player", "players", len(game.players))}, '
+                                   f'{game.edits_sent}/{game.edits_requested} edits sent, '
+                                   f'{game.edits_responded} in interaction responses')
+        for page in paginator.pages:
+            await ctx.send(page)
 
     @commands.command()
     @game_in_progress()
+    @serialized
     async def add(self, ctx, *new_players: discord.Member):
         """Add users to your game.
 
@@ -276,7 +595,7 @@ class Smash(commands.Cog):
         if not to_add:
             return
         players = game.add_players(*to_add)
-        self.players.update(players)
+        self.games.add_players(players)
         round_num = player.current_round - 1
         if round_num >= 0:
             for p in players.values():
@@ -285,6 +604,7 @@ class Smash(commands.Cog):
 
     @commands.command()
     @game_in_progress()
+    @serialized
     async def leave(self, ctx):
         """Leave your current game.
 
@@ -295,6 +615,7 @@ class Smash(commands.Cog):
 
     @commands.command()
     @game_in_progress(player_active=False)
+    @serialized
     async def rejoin(self, ctx):
         """Rejoin your game."""
         ctx.player.active = True
@@ -302,19 +623,17 @@ class Smash(commands.Cog):
 
     @commands.Cog.listener()
     async def on_message(self, msg):
-        if not msg.content:
+        # cheap checks first, most messages have nothing to do with a game
+        content = msg.content
+        if not content or msg.channel.id not in self.games.channels or msg.author not in self.players:
             return
-        ctx = await self.bot.get_context(msg)
-        if ctx.valid:
-            return
-        cmd = self.bot.get_command(ctx.view.get_word().lower())
-        prefix = await self.bot.get_prefix(msg)
-        if isinstance(prefix, list):
-            ctx.prefix = prefix[-1]
-        else:
-            ctx.prefix = prefix
-        if cmd is None or cmd.cog is not self or cmd not in self.short_commands:
+        view = StringView(content)
+        invoked_with = view.get_word()
+        cmd = self.short_dispatch.get(invoked_with.lower())
+        if cmd is None:
             return
+        ctx = commands.Context(prefix=config.prefix, view=view, bot=self.bot, message=msg,
+                               invoked_with=invoked_with, command=cmd)
         try:
             await cmd.invoke(ctx)
         except commands.CommandInvokeError as e:
@@ -328,9 +647,20 @@ class Smash(commands.Cog):
         except Exception as e:
             self.bot.dispatch('command_error', ctx, commands.CommandInvokeError(e))
 
+    def cog_unload(self):
+        for game in {player.game for player in self.players.values()}:
+            game.stop()
+        self.timers.stop()
+        self.deleter.flush()
+        self.store.close()
+        self.history.close()
+        for view in (self.game_view, self.activity_view):
+            if view is not None:
+                view.stop()
+
     async def cog_check(self, ctx):
         return ctx.guild
 
     async def cog_before_invoke(self, ctx):
         if ctx.command in self.delete_commands:
-            await ctx.message.delete(delay=1)
+            self.deleter.delete(ctx.message)
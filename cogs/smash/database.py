@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+
+
+class Database:
+    """SQLite connection only ever used from one worker thread, so queries never block the event loop."""
+    def __init__(self, loop, path, schema):
+        self.loop = loop
+        self.path = path
+        self.schema = schema
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._db = None
+
+    def _connection(self):
+        if self._db is None:
+            db = sqlite3.connect(self.path)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(self.schema)
+            self._db = db
+        return self._db
+
+    def _call(self, func, args):
+        return func(self._connection(), *args)
+
+    async def run(self, func, *args):
+        """Await `func(connection, *args)` run on the worker thread."""
+        return await self.loop.run_in_executor(self._executor, self._call, func, args)
+
+    def run_sync(self, func, *args):
+        """Run `func(connection, *args)` on the worker thread, blocking until it's done."""
+        return self._executor.submit(self._call, func, args).result()
+
+    def close(self):
+        if self._db is not None:
+            self._executor.submit(self._db.close).result()
+            self._db = None
+        self._executor.shutdown()
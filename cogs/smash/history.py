@@ -0,0 +1,281 @@
+"""Finished games and stats aggregated from them, in SQLite.
+
+Every finished game is recorded in full: mode, players, rounds, bans, duration and
+end reason. The stats commands read only the aggregate tables, which are updated
+in the same transaction as each game is recorded, so they never rescan history.
+Ratings are kept in memory as well, see `ratings`.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import itertools
+import logging
+import asyncio
+import sqlite3
+import os
+
+import discord
+
+from .ratings import Ratings, recompute
+from .database import Database
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'history.sqlite3')
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    guild INTEGER NOT NULL,
+    channel INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    arena TEXT,
+    winning_score INTEGER NOT NULL,
+    max_bans INTEGER,
+    started TEXT,
+    duration REAL,
+    reason TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    game TEXT NOT NULL REFERENCES games,
+    member INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    winner INTEGER NOT NULL,
+    PRIMARY KEY (game, member)
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    game TEXT NOT NULL REFERENCES games,
+    member INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    fighter TEXT NOT NULL,
+    win INTEGER NOT NULL,
+    PRIMARY KEY (game, member, round)
+);
+CREATE TABLE IF NOT EXISTS bans (
+    game TEXT NOT NULL REFERENCES games,
+    member INTEGER NOT NULL,
+    fighter TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_guild ON games (guild);
+CREATE INDEX IF NOT EXISTS players_member ON players (member);
+CREATE INDEX IF NOT EXISTS rounds_member ON rounds (member, fighter);
+CREATE INDEX IF NOT EXISTS rounds_fighter ON rounds (fighter);
+
+CREATE TABLE IF NOT EXISTS fighter_stats (
+    guild INTEGER NOT NULL,
+    fighter TEXT NOT NULL,
+    played INTEGER NOT NULL,
+    won INTEGER NOT NULL,
+    PRIMARY KEY (guild, fighter)
+);
+CREATE TABLE IF NOT EXISTS member_fighters (
+    guild INTEGER NOT NULL,
+    member INTEGER NOT NULL,
+    fighter TEXT NOT NULL,
+    played INTEGER NOT NULL,
+    won INTEGER NOT NULL,
+    PRIMARY KEY (guild, member, fighter)
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    guild INTEGER NOT NULL,
+    member INTEGER NOT NULL,
+    fighter TEXT NOT NULL,
+    rating REAL NOT NULL,
+    rounds INTEGER NOT NULL,
+    PRIMARY KEY (guild, member, fighter)
+);
+CREATE TABLE IF NOT EXISTS head_to_head (
+    guild INTEGER NOT NULL,
+    member INTEGER NOT NULL,
+    opponent INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    won INTEGER NOT NULL,
+    PRIMARY KEY (guild, member, opponent)
+);
+'''
+UNPLAYED = {'-', '???'}  # rounds with these aren't counted in stats
+
+
+def game_rows(game, reason):
+    """Rows recording `game` in each history table, and the aggregate increments it adds."""
+    guild = game.channel.guild.id
+    top = max((p.wins for p in game.players.values()), default=0)
+    duration = None
+    if game.created_at is not None:
+        duration = (discord.utils.utcnow() - game.created_at).total_seconds()
+    games = [(game.id, guild, game.channel.id, game.mode.name, game.arena_id, game.winning_score,
+              game.max_bans, game.created_at and game.created_at.isoformat(), duration, reason.name)]
+    players, rounds, bans = [], [], []
+    fighters, member_fighters, head_to_head = {}, {}, {}
+    by_round = {}  # {round: [(member, fighter, win)]}
+    for member, player in game.players.items():
+        players.append((game.id, member.id, player.wins, top > 0 and player.wins == top))
+        for number, round_ in enumerate(player.rounds):
+            name = round_.fighter.name
+            rounds.append((game.id, member.id, number, name, round_.win))
+            if name in UNPLAYED:
+                continue
+            for counts, key in ((fighters, (guild, name)), (member_fighters, (guild, member.id, name))):
+                played, won = counts.get(key, (0, 0))
+                counts[key] = (played + 1, won + round_.win)
+            by_round.setdefault(number, []).append((member.id, name, round_.win))
+        bans.extend((game.id, member.id, fighter.name) for fighter in player.bans)
+    for results in by_round.values():
+        for (member, _, win), (opponent, _, _) in itertools.permutations(results, 2):
+            played, won = head_to_head.get((guild, member, opponent), (0, 0))
+            head_to_head[guild, member, opponent] = (played + 1, won + win)
+    return {
+        'games': games,
+        'players': players,
+        'rounds': rounds,
+        'bans': bans,
+        'fighter_stats': [(*key, *counts) for key, counts in fighters.items()],
+        'member_fighters': [(*key, *counts) for key, counts in member_fighters.items()],
+        'head_to_head': [(*key, *counts) for key, counts in head_to_head.items()],
+        'results': [by_round[number] for number in sorted(by_round)],  # for `Ratings.rate_round`
+    }
+
+
+def recompute_rows(path):
+    """Rate every recorded round again, returning the rows of the new ratings.
+
+    Runs in a worker process, so it opens its own read-only connection.
+    """
+    placeholders = ', '.join('?' * len(UNPLAYED))
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rounds = db.execute('SELECT games.guild, games.id, rounds.round, rounds.member, rounds.fighter, rounds.win '
+                            'FROM rounds JOIN games ON rounds.game = games.id '
+                            f'WHERE rounds.fighter NOT IN ({placeholders}) '
+                            'ORDER BY games.rowid, rounds.round', tuple(UNPLAYED)).fetchall()
+    finally:
+        db.close()
+    return recompute(rounds).rows()
+
+
+class MatchHistory:
+    def __init__(self, loop, path=DB_PATH):
+        self.db = Database(loop, path, SCHEMA)
+        self.ratings = None  # see `load_ratings`
+        self.version = 0  # games recorded since loading
+        self._lock = asyncio.Lock()  # keeps `ratings` in step with the database
+        self._executor = None  # see `compute`
+
+    async def record(self, game, reason):
+        """Record a finished game, adding it to the stats and ratings.
+
+        A game already recorded is skipped, so recording is safe to retry.
+        """
+        rows = game_rows(game, reason)
+        if not rows['rounds']:
+            return
+        guild_id = game.channel.guild.id
+        async with self._lock:
+            ratings = await self._load_ratings()
+            rows['ratings'] = ratings.rate_rounds(guild_id, rows['results'])
+            try:
+                recorded = await self.db.run(self._write, rows)
+            except sqlite3.Error:
+                logging.exception(f'Failed to record game {game.id}.')
+                return
+            if recorded:
+                ratings.load(rows['ratings'])
+                self.version += 1
+
+    async def load_ratings(self):
+        """Return the `Ratings` of every guild, loading them first if needed."""
+        async with self._lock:
+            return await self._load_ratings()
+
+    async def _load_ratings(self):
+        if self.ratings is None:
+            ratings = Ratings()
+            ratings.load(await self.db.run(lambda db: db.execute('SELECT * FROM ratings').fetchall()))
+            self.ratings = ratings
+        return self.ratings
+
+    async def recompute_ratings(self):
+        """Rebuild every rating from the recorded rounds, returning the number of ratings.
+
+        Games can still be recorded while ratings are computed, in which case they are computed again.
+        """
+        while True:
+            version = self.version
+            rows = await self.compute(recompute_rows, self.db.path)
+            async with self._lock:
+                if self.version != version:
+                    continue
+                await self.db.run(self._replace_ratings, rows)
+                ratings = Ratings()
+                ratings.load(rows)
+                self.ratings = ratings
+                return len(rows)
+
+    async def compute(self, func, *args):
+        """Await `func(*args)` run in a worker process, for work over the history that would hold the GIL.
+
+        `func` must be a module level function, opening its own connection to `db.path`.
+        """
+        if self._executor is None:
+            # spawn, forking would copy the locks of the bot's threads
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return await self.db.loop.run_in_executor(self._executor, func, *args)
+
+    @staticmethod
+    def _replace_ratings(db, rows):
+        with db:
+            db.execute('DELETE FROM ratings')
+            db.executemany('INSERT INTO ratings VALUES (?, ?, ?, ?, ?)', rows)
+
+    @staticmethod
+    def _write(db, rows):
+        """Insert `rows`, returning False without changing anything if the game was already recorded."""
+        with db:
+            if not db.execute('INSERT OR IGNORE INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              rows['games'][0]).rowcount:
+                return False
+            db.executemany('INSERT INTO players VALUES (?, ?, ?, ?)', rows['players'])
+            db.executemany('INSERT INTO rounds VALUES (?, ?, ?, ?, ?)', rows['rounds'])
+            db.executemany('INSERT INTO bans VALUES (?, ?, ?)', rows['bans'])
+            db.executemany('INSERT INTO fighter_stats VALUES (?, ?, ?, ?) '
+                           'ON CONFLICT (guild, fighter) DO UPDATE '
+                           'SET played = played + excluded.played, won = won + excluded.won',
+                           rows['fighter_stats'])
+            db.executemany('INSERT INTO member_fighters VALUES (?, ?, ?, ?, ?) '
+                           'ON CONFLICT (guild, member, fighter) DO UPDATE '
+                           'SET played = played + excluded.played, won = won + excluded.won',
+                           rows['member_fighters'])
+            db.executemany('INSERT INTO head_to_head VALUES (?, ?, ?, ?, ?) '
+                           'ON CONFLICT (guild, member, opponent) DO UPDATE '
+                           'SET rounds = rounds + excluded.rounds, won = won + excluded.won',
+                           rows['head_to_head'])
+            db.executemany('INSERT OR REPLACE INTO ratings VALUES (?, ?, ?, ?, ?)', rows['ratings'])
+        return True
+
+    async def fighter_stats(self, guild_id, fighter=None, min_played=1, limit=None):
+        """Return `(fighter, played, won)` in `guild_id`, best win rate first."""
+        if fighter is not None:
+            query = 'SELECT fighter, played, won FROM fighter_stats WHERE guild = ? AND fighter = ?'
+            args = (guild_id, fighter)
+        else:
+            query = ('SELECT fighter, played, won FROM fighter_stats WHERE guild = ? AND played >= ? '
+                     'ORDER BY CAST(won AS REAL) / played DESC, played DESC LIMIT ?')
+            args = (guild_id, min_played, -1 if limit is None else limit)
+        return await self.db.run(lambda db: db.execute(query, args).fetchall())
+
+    async def most_played(self, guild_id, member_id, limit=10):
+        """Return `(fighter, played, won)` for a member's most played fighters in `guild_id`."""
+        query = ('SELECT fighter, played, won FROM member_fighters WHERE guild = ? AND member = ? '
+                 'ORDER BY played DESC, won DESC LIMIT ?')
+        return await self.db.run(lambda db: db.execute(query, (guild_id, member_id, limit)).fetchall())
+
+    async def head_to_head(self, guild_id, member_id, opponent_id):
+        """Return `(rounds, member's wins, opponent's wins)` over rounds both played in `guild_id`."""
+        query = 'SELECT rounds, won FROM head_to_head WHERE guild = ? AND member = ? AND opponent = ?'
+
+        def run(db):
+            mine = db.execute(query, (guild_id, member_id, opponent_id)).fetchone() or (0, 0)
+            theirs = db.execute(query, (guild_id, opponent_id, member_id)).fetchone() or (0, 0)
+            return mine[0], mine[1], theirs[1]
+        return await self.db.run(run)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.db.close()
@@ -0,0 +1,78 @@
+"""Fighter against fighter win rates over the whole match history.
+
+In each recorded round, the winners' fighters are counted as beating the fighters of
+everyone who lost it. Counting runs in the history's worker process with NumPy, and the
+result is cached until another game is recorded.
+"""
+import sqlite3
+
+import numpy as np
+
+
+def count_wins(path, fighters):
+    """Return `wins` where `wins[i, j]` counts rounds fighter `i` won against fighter `j`.
+
+    `fighters` are fighter names in roster order, giving the indices.
+    Runs in a worker process, so it opens its own read-only connection.
+    """
+    index = {name: i for i, name in enumerate(fighters)}
+    size = len(fighters)
+    try:
+        db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            rows = db.execute('SELECT game, round, fighter, win FROM rounds').fetchall()
+        finally:
+            db.close()
+    except sqlite3.OperationalError:  # nothing recorded yet
+        rows = []
+    rows = [row for row in rows if row[2] in index]  # skips sitting out, and fighters since removed
+    if not rows:
+        return np.zeros((size, size), dtype=np.int64)
+    games, numbers, names, wins = zip(*rows)
+    _, games = np.unique(np.array(games), return_inverse=True)
+    rounds = games.astype(np.int64) * (max(numbers) + 1) + np.array(numbers)  # unique per game and round
+    fighter = np.array([index[name] for name in names])
+    won = np.array(wins, dtype=bool)
+
+    # pair every loser with each winner of the same round
+    order = np.argsort(rounds[won], kind='stable')
+    winner_rounds, winner_fighters = rounds[won][order], fighter[won][order]
+    loser_rounds, loser_fighters = rounds[~won], fighter[~won]
+    first = np.searchsorted(winner_rounds, loser_rounds, 'left')
+    count = np.searchsorted(winner_rounds, loser_rounds, 'right') - first
+    losers = np.repeat(loser_fighters, count)
+    offsets = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    winners = winner_fighters[np.repeat(first, count) + offsets]
+    return np.bincount(winners * size + losers, minlength=size * size).reshape(size, size)
+
+
+class Matchups:
+    """Win counts between fighters, recounted only after the history changes."""
+    def __init__(self, loop, history, fighters):
+        self.loop = loop
+        self.history = history
+        self.fighters = fighters  # names, in roster order
+        self._version = None  # of `history` when `_counting` started
+        self._counting = None  # future of `count_wins`
+
+    async def wins(self):
+        """Return the win counts, see `count_wins`."""
+        version = self.history.version
+        if self._version != version:
+            self._version = version
+            self._counting = self.loop.create_task(self.history.compute(count_wins, self.history.db.path,
+                                                                        self.fighters))
+        try:
+            return await self._counting
+        except Exception:
+            self._version = None  # try again next time
+            raise
+
+    async def against(self, fighter):
+        """Return `(opponent index, wins, rounds)` for each other fighter `fighter` has played, by roster index."""
+        wins = await self.wins()
+        won, lost = wins[fighter], wins[:, fighter]
+        played = won + lost
+        played[fighter] = 0  # mirror matches count as both a win and a loss
+        opponents = np.flatnonzero(played)
+        return list(zip(opponents.tolist(), won[opponents].tolist(), played[opponents].tolist()))
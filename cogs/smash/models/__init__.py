@@ -3,5 +3,9 @@ from .game import Game, EndReason, arena_id
 from .fighter import Fighter, FakeFighter
 from .errors import SmashError
 from .player import Player
+from .events import Event
 from .menu import FighterPageSource, FighterMenu
-from .view import GameView
+from .view import GameView, ActivityView, Components, FakeContext
+from .timer import Deadlines
+from .registry import GameRegistry
+from .deleter import DeleteBatcher
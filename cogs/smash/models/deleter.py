@@ -0,0 +1,73 @@
+from collections import Counter
+import datetime
+import logging
+
+import discord
+
+BULK_LIMIT = 100  # messages per bulk delete
+BULK_WINDOW = datetime.timedelta(days=14, minutes=-1)  # only younger messages may be bulk deleted
+
+
+class DeleteBatcher:
+    """Delete messages in bulk, collecting them per channel for `delay` seconds.
+
+    Messages too old to bulk delete, and messages in channels the bot can't
+    manage messages in, are deleted one at a time.
+    """
+    def __init__(self, loop, delay=1):
+        self.loop = loop
+        self.delay = delay
+        self._pending = {}  # {channel ID: (channel, [message])}
+        self._handles = {}  # {channel ID: TimerHandle}
+        self.batch_sizes = Counter()  # {size: number of bulk deletes}
+        self.single_deletes = 0
+
+    def __len__(self):
+        """Number of messages waiting to be deleted."""
+        return sum(len(messages) for _, messages in self._pending.values())
+
+    def delete(self, message):
+        channel = message.channel
+        pending = self._pending.get(channel.id)
+        if pending is None:
+            self._pending[channel.id] = pending = (channel, [])
+            self._handles[channel.id] = self.loop.call_later(self.delay, self._flush, channel.id)
+        pending[1].append(message)
+        if len(pending[1]) >= BULK_LIMIT:
+            self._handles[channel.id].cancel()
+            self._flush(channel.id)
+
+    def flush(self):
+        """Delete everything pending now."""
+        for handle in self._handles.values():
+            handle.cancel()
+        for channel_id in list(self._pending):
+            self._flush(channel_id)
+
+    def _flush(self, channel_id):
+        del self._handles[channel_id]
+        channel, messages = self._pending.pop(channel_id)
+        self.loop.create_task(self._delete(channel, messages))
+
+    async def _delete(self, channel, messages):
+        cutoff = discord.utils.utcnow() - BULK_WINDOW
+        bulk = [m for m in messages if m.created_at > cutoff]
+        single = [m for m in messages if m.created_at <= cutoff]
+        if len(bulk) > 1 and channel.permissions_for(channel.guild.me).manage_messages:
+            try:
+                await channel.delete_messages(bulk)
+            except discord.Forbidden:
+                single.extend(bulk)
+            except discord.HTTPException:
+                logging.exception(f'Failed to bulk delete {len(bulk)} messages.')
+            else:
+                self.batch_sizes[len(bulk)] += 1
+        else:
+            single.extend(bulk)
+        for message in single:
+            try:
+                await message.delete()
+            except discord.HTTPException:
+                pass
+            else:
+                self.single_deletes += 1
@@ -0,0 +1,30 @@
+from enum import IntEnum
+
+
+class Event(IntEnum):
+    """Kinds of entries in a game's log.
+
+    Entries are tuples of the kind followed by plain arguments, so a log can be replayed
+    or stored as is. Entries for a player have the player's index second.
+    """
+    # game
+    ADD = 0  # member ID
+    MODE = 1  # mode key
+    WINS = 2  # winning score
+    BANS = 3  # max bans
+    ARENA = 4  # arena ID
+    # player, undoable
+    PICK = 5  # index, round, fighter code, code of the fighter replaced or INSERTED, rounds padded
+    WIN = 6  # index, round
+    UNDO = 7  # index, round, fighter code, whether the win was removed, whether the round was removed
+    # player
+    REVERT = 8  # index, position in the log of the entry undone
+    BAN = 9  # index, fighter code
+    UNBAN = 10  # index, fighter code
+    ACTIVE = 11  # index, active
+    VOTE = 12  # index, voted to end
+
+
+UNDOABLE = frozenset({Event.PICK, Event.WIN, Event.UNDO})
+INSERTED = -1  # replaced fighter code for a pick that inserted a new round
+FIGHTER_FIELDS = {Event.PICK: (3, 4), Event.UNDO: (3,), Event.BAN: (2,), Event.UNBAN: (2,)}  # positions of fighter codes
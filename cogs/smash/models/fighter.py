@@ -1,13 +1,23 @@
 from functools import lru_cache
+import itertools
+import bisect
+import heapq
 import re
 
 from discord.ext import commands
-import discord
 
-from ..data import fighters as _fighters
+from ..roster import load_roster
 from .errors import SmashError
 
 WORD = re.compile(r'\W+')
+MAX_KEYS = 8  # more prefix matches than this can't all be one fighter's name and aliases
+MIN_PREFIX = 2
+MAX_CHOICES = 25  # Discord's limit for autocomplete choices
+
+
+def normalize(text: str) -> str:
+    """Lowercase `text` and collapse punctuation and whitespace to single spaces."""
+    return ' '.join(word for word in WORD.split(text.lower()) if word)
 
 
 def find_ngrams(text: str, number: int = 3) -> set:
@@ -40,39 +50,133 @@ def compare_ngrams(ngrams1, ngrams2):
 
 class Fighter(commands.Converter):
     __fighters = {}
+    __postings = {}  # {ngram: [Fighter]}
+    __by_code = []
+    __exact = {}  # {normalized name, alias, or number: Fighter}
+    __prefix_keys = []  # sorted normalized names and aliases
+    __prefix_fighters = []  # fighter for each of __prefix_keys
     replace_on_insert = False
 
     async def convert(self, ctx, arg):
         return self.get_closest(arg)
 
     @classmethod
-    def add(cls, number, name, color, emoji, aliases=()):
-        self = cls()
-        self.number = number
-        self.name = name
-        self.color = color
-        self.emoji = emoji
-        self.aliases = aliases
-        self.__ngrams = frozenset(find_ngrams(name).union(*(find_ngrams(alias) for alias in aliases)))
-        cls.__fighters[name] = self
+    def load(cls, roster):
+        """Add every fighter of a compiled roster, see `load_roster`."""
+        columns = zip(*(roster[key] for key in ('numbers', 'names', 'colors', 'emojis', 'aliases')))
+        for number, name, color, emoji, aliases in columns:
+            if len(aliases) >= MAX_KEYS:  # `get_by_prefix` couldn't tell this fighter's keys from several fighters'
+                raise ValueError(f'{name} has {len(aliases)} aliases, at most {MAX_KEYS - 1} are supported.')
+            self = cls()
+            self.number = number
+            self.name = name
+            self.color = color
+            self.emoji = emoji
+            self.aliases = aliases
+            self.index = self.code = len(cls.__by_code)
+            self.bit = 1 << self.index
+            cls.__fighters[name] = self
+            cls.__by_code.append(self)
+        fighters = cls.__by_code
+        cls.__postings = {ngram: [fighters[i] for i in indices] for ngram, indices in roster['postings'].items()}
+        cls.__exact = {key: fighters[i] for key, i in roster['exact'].items()}
+        cls.__prefix_keys = roster['prefix_keys']
+        cls.__prefix_fighters = [fighters[i] for i in roster['prefix_fighters']]
 
     @classmethod
     def all(cls):
         return cls.__fighters.values()
 
     @classmethod
-    @lru_cache()
     def get_closest(cls, name):
-        ngrams = find_ngrams(name)
-        similarities = {fighter: compare_ngrams(fighter.__ngrams, ngrams) for fighter in cls.all()}
-        sorted_sims = sorted(similarities.items(), key=lambda pair: (pair[1], len(pair[0].name)))
-        highest = max(pair[1] for pair in sorted_sims)
-        if highest == 0:
+        """Find a fighter by exact name, alias or number, then unique prefix, then most similar ngrams."""
+        fighter = cls._lookup(normalize(name))
+        if fighter is None:
             raise SmashError(f'{name} is not a valid fighter.')
+        return fighter
+
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def _lookup(cls, key):
+        if not key:
+            return None
+        try:
+            return cls.__exact[key]
+        except KeyError:
+            pass
+        fighter = cls.get_by_prefix(key)
+        if fighter is not None:
+            return fighter
+        candidates = cls.get_candidates(key, 1)
+        return candidates[0][0] if candidates else None
+
+    @classmethod
+    def cache_info(cls):
+        """Hits and misses of the cache `get_closest` uses, keyed on normalized names."""
+        return cls._lookup.cache_info()
+
+    @classmethod
+    def autocomplete(cls, text, check=None, limit=MAX_CHOICES):
+        """Return up to `limit` fighters for partially typed `text`, best match first.
 
-        filtered = filter(lambda pair: pair[1] == highest, sorted_sims)
-        most_similar = next(filtered)
-        return most_similar[0]
+        Exact name, alias or number comes first, then names and aliases starting with `text`,
+        then the most similar ngrams. Fighters failing `check`, if given, are skipped.
+        """
+        fighters = cls._completions(normalize(text))
+        if check is not None:
+            fighters = (f for f in fighters if check(f))
+        return list(itertools.islice(fighters, limit))
+
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def _completions(cls, key):
+        if not key:
+            return tuple(cls.__fighters.values())
+        fighters = {}  # ordered set
+        exact = cls.__exact.get(key)
+        if exact is not None:
+            fighters[exact] = None
+        keys = cls.__prefix_keys
+        start = bisect.bisect_left(keys, key)
+        end = bisect.bisect_left(keys, key + '\U0010ffff', start)
+        fighters.update(dict.fromkeys(cls.__prefix_fighters[start:end]))
+        fighters.update(dict.fromkeys(f for f, _ in cls.get_candidates(key, len(cls.__by_code))))
+        return tuple(fighters)
+
+    @classmethod
+    def get_by_prefix(cls, key):
+        """Return the only fighter with a name or alias starting with normalized `key`, if there is one."""
+        if len(key) < MIN_PREFIX:
+            return None
+        keys = cls.__prefix_keys
+        start = bisect.bisect_left(keys, key)
+        end = bisect.bisect_left(keys, key + '\U0010ffff', start, min(len(keys), start + MAX_KEYS + 1))
+        fighters = set(cls.__prefix_fighters[start:end])
+        if len(fighters) == 1 and end - start <= MAX_KEYS:
+            return fighters.pop()
+        return None
+
+    @classmethod
+    def get_candidates(cls, name, k=5):
+        """Return up to `k` `(fighter, similarity)` pairs, most similar first.
+
+        Only fighters sharing at least one ngram with `name` are scored.
+        Ties are broken by shorter name, then roster order.
+        """
+        similarities = {}
+        for ngram in find_ngrams(name):
+            for fighter in cls.__postings.get(ngram, ()):
+                similarities[fighter] = similarities.get(fighter, 0) + 1
+        return heapq.nsmallest(k, similarities.items(),
+                               key=lambda pair: (-pair[1], len(pair[0].name), pair[0].index))
+
+    @classmethod
+    def from_code(cls, code):
+        """Return the fighter, or `FakeFighter`, stored as `code`."""
+        try:
+            return cls.__by_code[code]
+        except IndexError:
+            return FakeFighter.from_code(code)
 
     @classmethod
     def get_exact(cls, name):
@@ -84,7 +188,9 @@ class Fighter(commands.Converter):
 
 class _FakeFighter:
     ALLOWED = {'-': True, '???': False}
+    CODES = {'-': 0xffff, '???': 0xfffe}  # reserved from the top so they never collide with fighters
     __instances = {}  # hack to only ever have 1 + len(ALLOWED) instances
+    __by_code = {}
 
     @classmethod
     def populate(cls):
@@ -92,13 +198,18 @@ class _FakeFighter:
             self = cls()
             self.name = val
             self.color = 0xfffffe
+            self.bit = 0
+            self.code = cls.CODES[val]
             self.replace_on_insert = replace
-            cls.__instances[val] = self
+            cls.__instances[val] = cls.__by_code[self.code] = self
 
     @property
     def names(self):
         return self.__instances.keys()
 
+    def from_code(self, code):
+        return self.__by_code[code]
+
     def __instancecheck__(self, instance):  # allows instance to act as class in `isinstance`
         return isinstance(instance, self.__class__)
 
@@ -115,5 +226,5 @@ FakeFighter = _FakeFighter()
 FakeFighter.populate()
 
 
-for fighter_data in _fighters:
-    Fighter.add(*fighter_data)
+roster = load_roster(find_ngrams, normalize)
+Fighter.load(roster)
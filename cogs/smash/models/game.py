@@ -1,14 +1,28 @@
 from collections import deque
 from enum import Enum
+import itertools
+import datetime
 import asyncio
+import logging
+import bisect
+import uuid
 import re
 
 import discord
 
+from .fighter import Fighter, FakeFighter
 from .player import Player
+from .mask import FighterMask, FighterPool
+from .modes import MODES
+from .events import Event, INSERTED, FIGHTER_FIELDS
 
 
 ARENA_ID = re.compile(r'^[0-9A-HJ-NP-Y]{5}$', flags=re.IGNORECASE)
+EMBED_BUDGET = 5000  # leave room below Discord's 6000 character limit
+UPDATE_DELAY = 1  # seconds to coalesce board edits over
+INACTIVITY_TIMEOUT = 60 * 10
+_DEFAULT_MODE = next(iter(MODES))
+RESPONSE_DEADLINE = 2  # seconds after an interaction, Discord fails interactions not responded to within 3
 
 
 def arena_id(arg):
@@ -17,6 +31,21 @@ def arena_id(arg):
     raise ValueError(f'{arg} is not a valid Arena ID.')
 
 
+def fighter_named(name):
+    if name in FakeFighter.names:
+        return FakeFighter(name)
+    return Fighter.get_exact(name)
+
+
+def _convert_fighters(event, convert):
+    """Return a log entry as a list, with `convert` applied to each of its fighters."""
+    event = list(event)
+    for position in FIGHTER_FIELDS.get(event[0], ()):
+        if event[position] != INSERTED:
+            event[position] = convert(event[position])
+    return event
+
+
 class EndReason(Enum):
     win = 0
     vote = 1
@@ -24,67 +53,252 @@ class EndReason(Enum):
 
 
 class Game:
-    def __init__(self, ctx, arena_id, mode, members, winning_score, max_bans, created_at):
-        self.context = ctx
-        self.loop = ctx.bot.loop
+    __slots__ = ('id', 'cog', 'loop', 'log', '__arena_id', 'played', 'won', 'banned', 'players', 'player_list',
+                 '__mode', '__winning_score',
+                 '__max_bans', 'created_at', 'message', 'channel', 'view', '_ending', '_pending_edit',
+                 '_confirmation', '_end_votes', '_edit_lock', '_last_payload', '_view_changed',
+                 'edits_requested', 'edits_sent', 'edits_responded', '_commands', '_consumer', '_batching',
+                 '_batch_updated')
+
+    def __init__(self, cog, arena_id, mode, members, winning_score, max_bans, created_at):
+        self.id = uuid.uuid4().hex  # stable across restarts, see `GameStore`
+        self.cog = cog
+        self.loop = cog.bot.loop
+        self.log = []  # every change to the game, see `Event`
         self.arena_id = arena_id
+        self.played = FighterMask()  # counts are numbers of players, not rounds
+        self.won = FighterMask()
+        self.banned = FighterMask()
         self.players = {}
-        self.add_players(*members)
+        self.player_list = []  # in order of joining
         self.mode = mode
+        self.add_players(*members)
         self.winning_score = winning_score
         self.max_bans = max_bans
         self.created_at = created_at
         self.message = None
+        self.channel = None  # of `message`
+        self.view = None
         self._ending = False
-        self.__hide_rounds = 0
-        self._timer = None
+        self._pending_edit = None
+        self._confirmation = None  # future for the inactivity confirmation's answer
+        self._end_votes = set()
+        self._edit_lock = asyncio.Lock()
+        self._last_payload = None
+        self._view_changed = False
+        self.edits_requested = 0
+        self.edits_sent = 0
+        self.edits_responded = 0  # of `edits_sent`, made in interaction responses
+        self._commands = deque()  # [(func, args, kwargs, future)]
+        self._consumer = None
+        self._batching = False
+        self._batch_updated = False
+
+    async def run(self, func, *args, **kwargs):
+        """Await `func(*args, **kwargs)` once every command queued before it has run, returning its result.
+
+        Commands are run one at a time, so they never see each other half done.
+        Everything queued while a command runs is drained as one batch, with one board update at the end.
+        Commands still queued once the game has ended are dropped, returning `None`.
+        """
+        future = self.loop.create_future()
+        self._commands.append((func, args, kwargs, future))
+        if self._consumer is None:
+            self._consumer = self.loop.create_task(self._consume())
+        return await future
+
+    @property
+    def busy(self):
+        """Whether a command is running, so `run` would have to wait for it."""
+        return self._consumer is not None
+
+    async def _consume(self):
+        try:
+            while self._commands:
+                self._batching = True
+                try:
+                    while self._commands:
+                        func, args, kwargs, future = self._commands.popleft()
+                        if future.done():  # caller stopped waiting
+                            continue
+                        if self._ending:
+                            future.set_result(None)
+                            continue
+                        try:
+                            result = await func(*args, **kwargs)
+                        except asyncio.CancelledError:  # see `stop`
+                            future.cancel()
+                            raise
+                        except Exception as e:
+                            future.set_exception(e)
+                        else:
+                            future.set_result(result)
+                finally:
+                    self._batching = False
+                if self._batch_updated and not self._ending:
+                    await self.update()
+                self._batch_updated = False
+        finally:
+            self._consumer = None
+
+    def stop(self):
+        """Stop without ending, dropping queued commands, for when the cog is unloaded.
+
+        The game is left in `GameStore` for the reloaded cog to restore.
+        """
+        self._ending = True
+        if self._pending_edit is not None:
+            self._pending_edit.cancel()
+            self._pending_edit = None
+        if self._confirmation is not None:
+            self._confirmation.cancel()
+        for *_, future in self._commands:
+            future.cancel()
+        self._commands.clear()
+        if self._consumer is not None:
+            self._consumer.cancel()
+
+    def to_dict(self):
+        """Where the game is, for `GameStore`. Its state is saved as its log, see `log_entries`."""
+        return {
+            'id': self.id,
+            'guild': self.channel.guild.id,
+            'channel': self.channel.id,
+            'message': self.message.id,
+            'created_at': self.created_at.isoformat(),
+        }
+
+    def log_entries(self, start=0):
+        """Log entries from `start` for `GameStore`, with fighters named so they survive roster reordering."""
+        return [_convert_fighters(event, lambda code: Fighter.from_code(code).name) for event in self.log[start:]]
+
+    @classmethod
+    def from_dict(cls, cog, data, entries):
+        """Rebuild a game by replaying the `log_entries` saved with a `to_dict` snapshot, reattached to its board.
+
+        Returns `None` if its channel is gone or a player is no longer in the guild.
+        """
+        guild = cog.bot.get_guild(data['guild'])
+        channel = guild and guild.get_channel(data['channel'])
+        if channel is None:
+            return None
+        log = []
+        for event in entries:
+            kind, *args = _convert_fighters(event, lambda name: fighter_named(name).code)
+            log.append((Event(kind), *args))
+        members = {event[1]: guild.get_member(event[1]) for event in log if event[0] == Event.ADD}
+        if None in members.values():
+            return None
+        created_at = datetime.datetime.fromisoformat(data['created_at'])
+        self = cls.replay(cog, log, members, created_at)
+        self.id = data['id']
+        self.message = channel.get_partial_message(data['message'])
+        self.channel = channel
+        self.view = cog.game_components
+        return self
 
     def restart_timer(self):
-        if self._timer:
-            self._timer.cancel()
-        self._timer = self.loop.create_task(self.__inactivity_timer())
+        if not self._ending:
+            self.cog.timers.set(self, INACTIVITY_TIMEOUT)
 
-    async def __inactivity_timer(self):
-        await asyncio.sleep(60 * 10)
-
-        confirmation = await self.send('Are you still playing?')
-        emojis = ('\N{WHITE HEAVY CHECK MARK}', '\N{CROSS MARK}')
-        for emoji in emojis:
-            await confirmation.add_reaction(emoji)
-        votes = set()
-
-        def check(reaction, user):
-            if not (user in self.players and reaction.message.id == confirmation.id):
-                return False
-            elif reaction.emoji == emojis[0]:
-                return True
-            elif reaction.emoji == emojis[1] and user not in votes:
-                votes.add(user)
-                return len(votes) == self.votes_to_end
+    def on_inactive(self):
+        """Called by the cog's timers once nobody has updated the game in `INACTIVITY_TIMEOUT` seconds."""
+        self.loop.create_task(self.__inactivity_timer())
 
+    async def __inactivity_timer(self):
+        cog = self.cog
+        self._confirmation = self.loop.create_future()
+        self._end_votes = set()
+        confirmation = await self.send('Are you still playing?', view=cog.activity_components)
+        cog.confirmations[confirmation.id] = self
         try:
-            reaction, user = await self.context.bot.wait_for('reaction_add', check=check, timeout=60)
+            reason = await asyncio.wait_for(self._confirmation, timeout=60)
         except asyncio.TimeoutError:
-            await self.end(reason=EndReason.inactivity)
+            await self.run(self.end, reason=EndReason.inactivity)
         else:
-            if reaction.emoji == emojis[1]:
-                await self.end(reason=EndReason.vote)
+            if reason is not None:
+                await self.run(self.end, reason=reason)
         finally:
+            cog.confirmations.pop(confirmation.id, None)
+            self._confirmation = None
             await confirmation.delete()
             if not self._ending:
                 self.restart_timer()
 
-    @property
-    def channel(self):
-        try:
-            return self.message.channel
-        except AttributeError:
-            return None
+    def confirm_activity(self, member, playing):
+        """Answer the inactivity confirmation, either confirming the game continues or voting to end it."""
+        if self._confirmation is None or self._confirmation.done():
+            return
+        if playing:
+            self._confirmation.set_result(None)
+        else:
+            self._end_votes.add(member)
+            if len(self._end_votes) >= self.votes_to_end:
+                self._confirmation.set_result(EndReason.vote)
 
     @property
     def send(self):
         return self.channel.send
 
+    def record(self, event):
+        """Append `event` to the log, returning its position."""
+        self.log.append(event)
+        return len(self.log) - 1
+
+    def apply(self, event, members):
+        """Apply a log entry, `members` mapping member IDs to members for `Event.ADD`."""
+        kind, arg, *_ = event
+        if kind == Event.ADD:
+            self.add_players(members[arg])
+        elif kind == Event.MODE:
+            self.mode = MODES[arg]
+        elif kind == Event.WINS:
+            self.winning_score = arg
+        elif kind == Event.BANS:
+            self.max_bans = arg
+        elif kind == Event.ARENA:
+            self.arena_id = arg
+        else:
+            self.player_list[arg].apply(event)
+
+    @classmethod
+    def replay(cls, cog, log, members, created_at=None):
+        """Rebuild a game from its log alone."""
+        self = cls(cog, None, MODES[_DEFAULT_MODE], (), 0, None, created_at)
+        self.log.clear()
+        for event in log:
+            self.apply(event, members)
+        return self
+
+    @property
+    def arena_id(self):
+        return self.__arena_id
+
+    @arena_id.setter
+    def arena_id(self, arena_id):
+        self.__arena_id = arena_id
+        self.record((Event.ARENA, arena_id))
+
+    @property
+    def mode(self):
+        return self.__mode
+
+    @mode.setter
+    def mode(self, mode):
+        self.__mode = mode
+        self.record((Event.MODE, mode.name.lower()))
+        for player in self.players.values():
+            self.fill_eligible(player)
+
+    @property
+    def winning_score(self):
+        return self.__winning_score
+
+    @winning_score.setter
+    def winning_score(self, score):
+        self.__winning_score = score
+        self.record((Event.WINS, score))
+
     @property
     def max_bans(self):
         return self.__max_bans
@@ -92,13 +306,56 @@ class Game:
     @max_bans.setter
     def max_bans(self, maxlen):
         self.__max_bans = maxlen
+        self.record((Event.BANS, maxlen))
         for player in self.players.values():
-            player.bans = deque(player.bans, maxlen)
+            player.limit_bans(maxlen)
 
     @property
     def votes_to_end(self):
         return sum(1 for p in self.players.values() if p.active) // 2 + 1
 
+    def render_player(self, member, player):
+        """Return `player`'s field name, round lines, cumulative line lengths, and last field value.
+
+        These are cached on the player and only rebuilt when it has changed.
+        The field value is `(hidden rounds, text)`, or `None` until `embed` fills it in.
+        """
+        if player.dirty:
+            if self._ending and player.wins >= self.winning_score:
+                status = '\\\N{TROPHY}'
+            elif player.end:
+                status = '\\\N{CROSS MARK}'
+            else:
+                status = ''
+            name = '{active}**{name}**{active}\n{status}Wins: {wins}'.format(
+                name=member.name, wins=player.wins, status=status,
+                active='' if player.active else '~~')
+            lines = [f'{ind}. {round_}' for ind, round_ in enumerate(player.rounds, 1)]
+            sizes = list(itertools.accumulate(map(len, lines), initial=0))
+            player.rendered = (name, lines, sizes, None)
+            player.dirty = False
+        return player.rendered
+
+    @staticmethod
+    def _field_size(sizes, hide):
+        shown = len(sizes) - 1 - hide
+        if shown <= 0:
+            return 1  # '\u200b'
+        return sizes[-1] - sizes[hide] + shown - 1  # lines + newlines
+
+    def _rounds_to_hide(self, size, rendered):
+        """Return the fewest leading rounds to hide for the embed to fit in `EMBED_BUDGET`.
+
+        `size` is the size of everything but field values.
+        """
+        sizes = [r[2] for r in rendered]
+
+        def fits(hide):
+            return size + sum(self._field_size(s, hide) for s in sizes) <= EMBED_BUDGET
+
+        most = max((len(s) - 1 for s in sizes), default=0)
+        return bisect.bisect_left(range(most), True, key=fits)
+
     @property
     def embed(self):
         e = discord.Embed()
@@ -117,74 +374,159 @@ class Game:
             desc.append('**Bans:**')
             desc.extend(bans)
         e.description = '\n'.join(desc)
-        last_fighter, last_round = None, -1
-        for index, pair in enumerate(self.players.items()):
-            member, player = pair
-            win_count = player.wins
-            try:
-                latest_win = player.latest_win_round
-            except ValueError:
-                latest_win = -1
-            if latest_win > last_round:
-                last_fighter = player.rounds[latest_win].fighter
-                last_round = latest_win
-            if self._ending and win_count >= self.winning_score:
-                status = '\\\N{TROPHY}'
-            elif player.end:
-                status = '\\\N{CROSS MARK}'
-            else:
-                status = ''
-            name = '{active}**{name}**{active}\n{status}Wins: {wins}'.format(
-                name=member.name, wins=win_count, status=status,
-                active='' if player.active else '~~')
-            rounds = []
-            for ind, round_ in enumerate(player.rounds[self.__hide_rounds:], self.__hide_rounds):
-                rounds.append(f'{ind + 1}. {round_}')
-            e.add_field(name=name, value='\n'.join(rounds) or '\u200b')
         if self.winning_score:
             e.set_footer(text=f'First to {self.winning_score} wins! | Started')
         else:
             e.set_footer(text='Started')
         e.timestamp = self.created_at
+
+        last_fighter, last_round = None, -1
+        rendered = []
+        for member, player in self.players.items():
+            latest_win = player.latest_win_round
+            if latest_win > last_round:
+                last_fighter = player.rounds[latest_win].fighter
+                last_round = latest_win
+            rendered.append(self.render_player(member, player))
         if last_round > -1:
             e.color = last_fighter.color
-        if len(e) > 5000:
-            self.__hide_rounds += 1
+
+        hide = self._rounds_to_hide(len(e) + sum(len(r[0]) for r in rendered), rendered)
+        for player, (name, lines, sizes, value) in zip(self.players.values(), rendered):
+            if value is None or value[0] != hide:
+                value = (hide, '\n'.join(lines[hide:]) or '\u200b')
+                player.rendered = (name, lines, sizes, value)
+            e.add_field(name=name, value=value[1])
         return e
 
-    async def update(self, *, embed=None, destination=None, view=discord.utils.MISSING):
+    async def update(self, *, embed=None, destination=None, view=discord.utils.MISSING, flush=False):
+        """Request the board be updated.
+
+        Edits are coalesced over `UPDATE_DELAY` seconds and always show the latest state.
+        Sending to a `destination`, passing an `embed`, or passing `flush` updates immediately.
+        Other updates requested by queued commands wait for their batch to be drained.
+        """
         if view is not discord.utils.MISSING:
             self.view = view
+            self._view_changed = True
+        immediate = flush or destination or embed
+        if self._batching and not immediate:
+            self._batch_updated = True  # requested once the batch is drained
+            return
+        self.edits_requested += 1
+        self.restart_timer()
+        self.cog.store.mark(self)
+        if immediate:
+            await self.flush(embed=embed, destination=destination)
+        else:
+            self._schedule_edit()
+
+    def _schedule_edit(self):
+        if self._pending_edit is None:
+            self._pending_edit = self.loop.call_later(UPDATE_DELAY, self._flush_later)
+
+    def _flush_later(self):
+        self._pending_edit = None
+        self.loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        try:
+            await self.flush()
+        except discord.HTTPException:
+            logging.exception('Failed to update board.')
+
+    async def flush(self, *, embed=None, destination=None):
+        """Send any pending update now, skipping the edit if nothing visible changed."""
+        async with self._edit_lock:
+            await self._flush(embed=embed, destination=destination)
+
+    async def respond(self, interaction):
+        """Acknowledge a component interaction on the board by editing the board in the response.
+
+        This replaces the pending board edit, saving an HTTP call. If the board is already being edited,
+        or `RESPONSE_DEADLINE` seconds have passed since the interaction, it is deferred right away
+        and the edit is left pending.
+        """
+        if interaction.response.is_done():  # deferred while waiting for other commands
+            return
+        if self._ending or self.message is None or interaction.message.id != self.message.id:
+            await interaction.response.defer()
+            return
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        if self._edit_lock.locked() or elapsed >= RESPONSE_DEADLINE:
+            await interaction.response.defer()
+            return
+        async with self._edit_lock:
+            await self._flush(interaction=interaction)
+        if not interaction.response.is_done() and self._pending_edit is None:  # nothing changed
+            await interaction.response.defer()
+
+    async def _flush(self, *, embed=None, destination=None, interaction=None):
+        if self._pending_edit is not None:
+            self._pending_edit.cancel()
+            self._pending_edit = None
         embed = embed or self.embed
-        
+        payload = embed.to_dict()
         if destination:
             old_msg = self.message
             try:
-                self.message = await destination.send(embed=embed, view=view)
+                self.message = await destination.send(embed=embed, view=self.view)
             except Exception as e:
                 await self.send(e, delete_after=5)
+                return
+            self.channel = self.message.channel
+            if old_msg:
+                await old_msg.delete()
+        elif payload != self._last_payload or self._view_changed:
+            view = self.view if self._view_changed else discord.utils.MISSING
+            if interaction is not None:
+                try:
+                    await interaction.response.edit_message(embed=embed, view=view)
+                except discord.HTTPException:  # likely expired, edit the message instead
+                    self._schedule_edit()
+                    return
+                self.edits_responded += 1
             else:
-                if old_msg:
-                    await old_msg.delete()
+                await self.message.edit(embed=embed, view=view)
         else:
-            await self.message.edit(embed=embed, view=view)
-            
-        self.restart_timer()
+            return
+        self.edits_sent += 1
+        self._last_payload = payload
+        self._view_changed = False
 
     def add_players(self, *members):
-        players = {member: Player(member, self) for member in members}
-        self.players.update(players)
+        players = {}
+        for member in members:
+            players[member] = player = Player(member, self, len(self.player_list))
+            self.players[member] = player
+            self.player_list.append(player)
+            self.record((Event.ADD, member.id))
+            self.fill_eligible(player)
         return players
 
+    def fill_eligible(self, player):
+        """Rebuild the fighters `player` may pick from scratch."""
+        pick_check = self.mode.pick_check
+        player.eligible = FighterPool(f for f in Fighter.all() if pick_check(player, f))
+
+    def refresh_eligible(self, fighter):
+        """Recheck whether each player may pick `fighter` after its played/won/banned state changed."""
+        pick_check = self.mode.pick_check
+        for player in self.players.values():
+            if pick_check(player, fighter):
+                player.eligible.add(fighter)
+            else:
+                player.eligible.discard(fighter)
+
     def is_banned(self, fighter):
-        return any(p.has_banned(fighter) for p in self.players.values())
+        return fighter in self.banned
 
     async def end(self, reason=EndReason.win):
         self._ending = True
-        self.view.stop()
-        if self._timer:
-            self._timer.cancel()
-        await self.update(view=None)
+        for player in self.players.values():
+            player.dirty = True  # show trophies
+        self.cog.timers.remove(self)
+        await self.update(view=None, flush=True)
         mentions = ' '.join([m.mention for m in self.players])
         if reason is EndReason.vote:
             await self.send(f'{mentions}\nThe game ended by majority vote.', delete_after=15)
@@ -193,5 +535,8 @@ class Game:
         else:
             member, player = max(self.players.items(), key=lambda p: p[1].wins)
             await self.send(f'{mentions}\n**{member.display_name} won!**', delete_after=15)
-        for m in self.players:
-            self.context.cog.players.pop(m, None)
+        try:
+            await self.cog.history.record(self, reason)
+        finally:
+            self.cog.games.remove(self)
+            self.cog.store.remove(self)
@@ -0,0 +1,79 @@
+import random
+
+
+class FighterMask:
+    """Multiset of fighters, keeping a bitmask of every fighter counted at least once.
+
+    Each fighter has a `bit`, `FakeFighter`s have a `bit` of 0 and are never counted.
+    """
+    __slots__ = ('counts', 'mask')
+
+    def __init__(self):
+        self.counts = {}  # {bit: count}
+        self.mask = 0
+
+    def __contains__(self, fighter):
+        return bool(self.mask & fighter.bit)
+
+    def count(self, fighter):
+        return self.counts.get(fighter.bit, 0)
+
+    def add(self, fighter):
+        """Count `fighter` once more, returning whether it was newly added to the mask."""
+        bit = fighter.bit
+        if not bit:
+            return False
+        count = self.counts.get(bit, 0)
+        self.counts[bit] = count + 1
+        if count:
+            return False
+        self.mask |= bit
+        return True
+
+    def remove(self, fighter):
+        """Count `fighter` once less, returning whether it was removed from the mask."""
+        bit = fighter.bit
+        if not bit:
+            return False
+        count = self.counts[bit] - 1
+        if count:
+            self.counts[bit] = count
+            return False
+        del self.counts[bit]
+        self.mask &= ~bit
+        return True
+
+
+class FighterPool:
+    """Set of fighters with O(1) `add`, `discard` and uniformly random `choice`."""
+    __slots__ = ('fighters', 'positions')
+
+    def __init__(self, fighters=()):
+        self.fighters = []
+        self.positions = {}  # {fighter: index in self.fighters}
+        for fighter in fighters:
+            self.add(fighter)
+
+    def __len__(self):
+        return len(self.fighters)
+
+    def __contains__(self, fighter):
+        return fighter in self.positions
+
+    def add(self, fighter):
+        if fighter in self.positions:
+            return
+        self.positions[fighter] = len(self.fighters)
+        self.fighters.append(fighter)
+
+    def discard(self, fighter):
+        index = self.positions.pop(fighter, None)
+        if index is None:
+            return
+        last = self.fighters.pop()
+        if last is not fighter:  # swap the last fighter into the hole
+            self.fighters[index] = last
+            self.positions[last] = index
+
+    def choice(self):
+        return random.choice(self.fighters)
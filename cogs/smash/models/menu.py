@@ -55,30 +55,30 @@ class FighterMenu(ui.View, menus.MenuPages):
             self.last_page.disabled = True
 
     @ui.button(emoji='\N{BLACK LEFT-POINTING DOUBLE TRIANGLE WITH VERTICAL BAR}\ufe0f')
-    async def first_page(self, btn: ui.Button, itx: Interaction):
+    async def first_page(self, itx: Interaction, btn: ui.Button):
         self.current_page = 0
         self.update_buttons()
         await self.show_current_page()
 
     @ui.button(emoji='\N{BLACK RIGHT-POINTING TRIANGLE}\ufe0f')
-    async def prev_page(self, btn: ui.Button, itx: Interaction):
+    async def prev_page(self, itx: Interaction, btn: ui.Button):
         self.current_page -= 1
         self.update_buttons()
         await self.show_current_page()
 
     @ui.button(emoji='\N{BLACK SQUARE FOR STOP}\ufe0f')
-    async def stop_view(self, btn: ui.Button, itx: Interaction):
+    async def stop_view(self, itx: Interaction, btn: ui.Button):
         self.stop()
         await self.message.delete(delay=0)  # silently ignore failure
 
     @ui.button(emoji='\N{BLACK RIGHT-POINTING TRIANGLE}\ufe0f')
-    async def next_page(self, btn: ui.Button, itx: Interaction):
+    async def next_page(self, itx: Interaction, btn: ui.Button):
         self.current_page += 1
         self.update_buttons()
         await self.show_current_page()
 
     @ui.button(emoji='\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE WITH VERTICAL BAR}\ufe0f')
-    async def last_page(self, btn: ui.Button, itx: Interaction):
+    async def last_page(self, itx: Interaction, btn: ui.Button):
         self.current_page = (self._source.get_max_pages() - 1)
         self.update_buttons()
         await self.show_current_page()
\ No newline at end of file
@@ -34,13 +34,13 @@ class Smash:
 
     @staticmethod
     def pick_check(player, fighter):
-        if player.game.is_banned(fighter):
+        if fighter in player.game.banned:
             return CheckResult(False, f'{fighter} is banned.')
         return CheckResult(True)
 
     @staticmethod
     def ban_check(player, fighter):
-        if player.game.is_banned(fighter):
+        if fighter in player.game.banned:
             return CheckResult(False, f'{fighter} is already banned.')
         return CheckResult(True)
 
@@ -51,17 +51,18 @@ class Elimination:
 
     @staticmethod
     def pick_check(player, fighter):
-        if player.has_played(fighter):
+        if fighter in player.played:
             return CheckResult(False, f'You have already played {fighter}.')
-        elif player.game.is_banned(fighter):
+        elif fighter in player.game.banned:
             return CheckResult(False, f'{fighter} is banned.')
         return CheckResult(True)
 
     @staticmethod
     def ban_check(player, fighter):
-        if all(pl.has_played(fighter) for pl in player.game.players.values()):
+        game = player.game
+        if game.played.count(fighter) == len(game.players):
             return CheckResult(False, f'Everyone has already played {fighter}.')
-        elif player.game.is_banned(fighter):
+        elif fighter in game.banned:
             return CheckResult(False, f'{fighter} is already banned.')
         return CheckResult(True)
 
@@ -72,20 +73,20 @@ class Smashdown:
 
     @staticmethod
     def pick_check(player, fighter):
-        for plyr in player.game.players.values():
-            if plyr.has_played(fighter):
-                return CheckResult(False, f'{fighter} has already been played.')
-            elif plyr.has_banned(fighter):
-                return CheckResult(False, f'{fighter} is banned.')
+        game = player.game
+        if fighter in game.played:
+            return CheckResult(False, f'{fighter} has already been played.')
+        elif fighter in game.banned:
+            return CheckResult(False, f'{fighter} is banned.')
         return CheckResult(True)
 
     @staticmethod
     def ban_check(player, fighter):
-        for plyr in player.game.players.values():
-            if plyr.has_played(fighter):
-                return CheckResult(False, f'{fighter} has already been played.')
-            elif plyr.has_banned(fighter):
-                return CheckResult(False, f'{fighter} is already banned.')
+        game = player.game
+        if fighter in game.played:
+            return CheckResult(False, f'{fighter} has already been played.')
+        elif fighter in game.banned:
+            return CheckResult(False, f'{fighter} is already banned.')
         return CheckResult(True)
 
 
@@ -96,21 +97,17 @@ class Smasharound:
     @staticmethod
     def pick_check(player, fighter):
         game = player.game
-        if game.is_banned(fighter):
+        if fighter in game.banned:
             return CheckResult(False, f'{fighter} is banned.')
-        for p in game.players.values():
-            for round_ in p.rounds:
-                if round_.win and round_.fighter == fighter:
-                    return CheckResult(False, f'{fighter} has already won.')
+        elif fighter in game.won:
+            return CheckResult(False, f'{fighter} has already won.')
         return CheckResult(True)
 
     @staticmethod
     def ban_check(player, fighter):
         game = player.game
-        if game.is_banned(fighter):
+        if fighter in game.banned:
             return CheckResult(False, f'{fighter} is already banned.')
-        for p in game.players.values():
-            for round_ in p.rounds:
-                if round_.win and round_.fighter == fighter:
-                    return CheckResult(False, f'{fighter} has already won.')
+        elif fighter in game.won:
+            return CheckResult(False, f'{fighter} has already won.')
         return CheckResult(True)
@@ -1,11 +1,15 @@
-from dataclasses import dataclass
+from collections.abc import Sequence
 from collections import deque
+from typing import NamedTuple
+from array import array
+import functools
 
 from .fighter import Fighter, FakeFighter
+from .mask import FighterMask, FighterPool
+from .events import Event, UNDOABLE, INSERTED
 
 
-@dataclass
-class Round:
+class Round(NamedTuple):
     fighter: Fighter
     win: bool = False
 
@@ -13,90 +17,299 @@ class Round:
         return '{1}{0}{1}'.format(self.fighter, '__' if self.win else '')
 
 
+class Rounds(Sequence):
+    """Read-only view of a player's rounds as `Round`s.
+
+    Rounds are stored as an array of fighter codes and a bitmap of which rounds were won.
+    """
+    __slots__ = ('_player',)
+
+    def __init__(self, player):
+        self._player = player
+
+    def __len__(self):
+        return len(self._player._codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        codes = self._player._codes
+        code = codes[index]
+        return Round(Fighter.from_code(code), self._player.won_round(index % len(codes)))
+
+    def __repr__(self):
+        return f'Rounds({list(self)!r})'
+
+
+def mutates(func):
+    """Mark the player to be re-rendered after `func`, running `Player.check` when `Player.self_check` is enabled."""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        result = func(self, *args, **kwargs)
+        self.dirty = True
+        if self.self_check:
+            self.check()
+        return result
+    return wrapper
+
+
 class Player:
-    def __init__(self, member, game):
+    __slots__ = ('member', 'game', 'index', 'history', 'rounds', '_codes', '_win_bits', 'wins', 'latest_win_round', 'bans',
+                 'dirty', 'rendered', '_end', '_active', 'played', 'won', 'banned', 'eligible')
+    self_check = False  # verify maintained state after every mutation, for tests
+
+    def __init__(self, member, game, index):
         self.member = member
         self.game = game
-        self.rounds = []
+        self.index = index  # in `game.player_list`, and log entries
+        self.history = []  # log positions of undoable entries still applied, latest last
+        self.rounds = Rounds(self)
+        self._codes = array('H')  # fighter code of each round
+        self._win_bits = 0  # bit `n` is set if round `n` was won
+        self.wins = 0
+        self.latest_win_round = -1
         self.bans = deque()
-        self.end = False
-        self.active = True
+        self.dirty = True  # whether `rendered` is stale
+        self.rendered = None  # see `Game.render_player`
+        self._end = False
+        self._active = True
+        self.played = FighterMask()
+        self.won = FighterMask()
+        self.banned = FighterMask()
+        self.eligible = FighterPool()  # fighters `game.mode` allows this player to pick
+
+    def _track(self, attr, fighter):
+        """Count `fighter` in this player's mask `attr` and, if it's new to the player, the game's."""
+        if getattr(self, attr).add(fighter):
+            getattr(self.game, attr).add(fighter)
+            self.game.refresh_eligible(fighter)
+
+    def _untrack(self, attr, fighter):
+        if getattr(self, attr).remove(fighter):
+            getattr(self.game, attr).remove(fighter)
+            self.game.refresh_eligible(fighter)
 
     @property
-    def current_round(self):
-        return len(self.rounds) - 1
+    def end(self):
+        return self._end
+
+    @end.setter
+    def end(self, value):
+        self.apply((Event.VOTE, self.index, value))
 
     @property
-    def wins(self):
-        return sum(r.win for r in self.rounds)
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, value):
+        self.apply((Event.ACTIVE, self.index, value))
 
     @property
-    def latest_win_round(self):
-        for ind, round_ in enumerate(reversed(self.rounds), 1):
-            if round_.win:
-                return len(self.rounds) - ind
-        return -1
+    def current_round(self):
+        return len(self._codes) - 1
+
+    def won_round(self, index):
+        return bool(self._win_bits >> index & 1)
+
+    def _insert_round(self, index, fighter):
+        self._codes.insert(index, fighter.code)
+        bits = self._win_bits
+        self._win_bits = (bits & ((1 << index) - 1)) | ((bits >> index) << (index + 1))
+        if self.latest_win_round >= index:
+            self.latest_win_round += 1
+
+    def _pop_round(self, index):
+        fighter = Fighter.from_code(self._codes.pop(index))
+        bits = self._win_bits
+        self._win_bits = (bits & ((1 << index) - 1)) | ((bits >> (index + 1)) << index)
+        if self.latest_win_round > index:
+            self.latest_win_round -= 1
+        return fighter
+
+    def _remove_win(self, index):
+        self._win_bits &= ~(1 << index)
+        self.wins -= 1
+        if index == self.latest_win_round:
+            self.latest_win_round = self._win_bits.bit_length() - 1
+
+    def check(self):
+        """Assert that all maintained state matches what is recomputed from rounds and bans."""
+        wins = [ind for ind, round_ in enumerate(self.rounds) if round_.win]
+        assert self._win_bits >> len(self._codes) == 0, 'wins past the last round'
+        assert self.wins == len(wins), (self.wins, len(wins))
+        assert self.latest_win_round == (wins[-1] if wins else -1), (self.latest_win_round, wins)
+        assert self.played.mask == sum({r.fighter.bit for r in self.rounds}), 'played mask'
+        assert self.won.mask == sum({r.fighter.bit for r in self.rounds if r.win}), 'won mask'
+        assert self.banned.mask == sum({f.bit for f in self.bans}), 'banned mask'
 
     def has_played(self, fighter):
-        if isinstance(fighter, FakeFighter):
-            return False
-        for round_ in self.rounds:
-            if round_.fighter == fighter:
-                return True
-        return False
+        return fighter in self.played
 
     def has_banned(self, fighter):
-        return fighter in self.bans
+        return fighter in self.banned
 
     def ban(self, fighter):
-        self.bans.append(fighter)
+        if self.bans.maxlen == 0:
+            return
+        self.apply((Event.BAN, self.index, fighter.code))
 
     def unban(self, fighter):
-        self.bans.remove(fighter)
+        self.apply((Event.UNBAN, self.index, fighter.code))
+
+    @mutates
+    def limit_bans(self, maxlen):
+        """Keep only the `maxlen` most recent bans."""
+        bans = deque(self.bans, maxlen)
+        for fighter in list(self.bans)[:len(self.bans) - len(bans)]:
+            self._untrack('banned', fighter)
+        self.bans = bans
 
     def vote_to_end(self):
         self.end = not self.end
 
     def play(self, fighter, round_num=None):
-        if round_num is not None:
-            round_diff = round_num - self.current_round
-            if round_diff > 0:
-                self.rounds.extend(Round(FakeFighter('-')) for _ in range(round_diff))
-            if self.rounds[round_num].fighter.replace_on_insert:
-                self.rounds[round_num].fighter = fighter
-            else:
-                self.rounds.insert(round_num, Round(fighter))
+        codes = self._codes
+        if round_num is None:
+            self.apply((Event.PICK, self.index, len(codes), fighter.code, INSERTED, 0))
+            return
+        pad = max(round_num - self.current_round, 0)
+        if pad:
+            index = round_num
+            replaced = FakeFighter('-')
         else:
-            self.rounds.append(Round(fighter))
+            replaced = Fighter.from_code(codes[round_num])
+            index = round_num % len(codes)
+        replaced = replaced.code if replaced.replace_on_insert else INSERTED
+        self.apply((Event.PICK, self.index, index, fighter.code, replaced, pad))
 
     def win(self, round_num=None):
         if round_num is None:
             round_num = self.current_round
         try:
-            round_ = self.rounds[round_num]
+            self._codes[round_num]
         except IndexError:
             return False
-        else:
-            if round_.win:
-                return False
-            round_.win = True
-            return True
+        round_num %= len(self._codes)
+        if self.won_round(round_num):
+            return False
+        self.apply((Event.WIN, self.index, round_num))
+        return True
 
     def undo(self, remove_action=None, round_num=None):
-        if not self.rounds:
-            return False
+        """Undo the latest pick, win or undo, or with `round_num`, the win and optionally pick of that round."""
         if round_num is None:
-            round_num = -1
-            round_ = self.rounds[round_num]
-            if remove_action is None and not round_.win:
-                remove_action = 'play'
-        else:
-            try:
-                round_ = self.rounds[round_num]
-            except IndexError:
+            if not self.history:
                 return False
-        if remove_action == 'play':
-            self.rounds.pop(round_num)
-        else:
-            round_.win = False
+            self.apply((Event.REVERT, self.index, self.history[-1]))
+            return True
+        try:
+            code = self._codes[round_num]
+        except IndexError:
+            return False
+        round_num %= len(self._codes)
+        won = self.won_round(round_num)
+        removed = remove_action == 'play'
+        if not (won or removed):
+            return False
+        self.apply((Event.UNDO, self.index, round_num, code, won, removed))
         return True
+
+    @mutates
+    def apply(self, event):
+        """Apply a log entry for this player and append it to the game's log."""
+        kind, _, *args = event
+        if kind == Event.REVERT:
+            self.history.pop()
+            self._revert(self.game.log[args[0]])
+        elif kind == Event.PICK:
+            self._pick(*args)
+        elif kind == Event.WIN:
+            self._win(*args)
+        elif kind == Event.UNDO:
+            self._undo_round(*args)
+        elif kind == Event.BAN:
+            self._ban(Fighter.from_code(args[0]))
+        elif kind == Event.UNBAN:
+            fighter = Fighter.from_code(args[0])
+            self.bans.remove(fighter)
+            self._untrack('banned', fighter)
+        elif kind == Event.ACTIVE:
+            self._active = args[0]
+        elif kind == Event.VOTE:
+            self._end = args[0]
+        else:
+            raise ValueError(f'{event} is not a player event.')
+        position = self.game.record(event)
+        if kind in UNDOABLE:
+            self.history.append(position)
+
+    def _revert(self, event):
+        """Exactly invert an undoable entry, which must be the latest undoable entry still applied."""
+        kind, _, *args = event
+        if kind == Event.PICK:
+            self._unpick(*args)
+        elif kind == Event.WIN:
+            self._unwin(*args)
+        else:
+            self._redo_round(*args)
+
+    def _ban(self, fighter):
+        bans = self.bans
+        if bans.maxlen is not None and len(bans) == bans.maxlen:
+            self._untrack('banned', bans[0])  # about to be pushed out by `append`
+        bans.append(fighter)
+        self._track('banned', fighter)
+
+    def _pick(self, index, code, replaced, pad):
+        if pad:
+            self._codes.extend([FakeFighter('-').code] * pad)
+        fighter = Fighter.from_code(code)
+        if replaced == INSERTED:
+            self._insert_round(index, fighter)
+            self._track('played', fighter)
+        else:
+            self._swap_round(index, Fighter.from_code(replaced), fighter)
+
+    def _unpick(self, index, code, replaced, pad):
+        fighter = Fighter.from_code(code)
+        if replaced == INSERTED:
+            self._pop_round(index)
+            self._untrack('played', fighter)
+        else:
+            self._swap_round(index, fighter, Fighter.from_code(replaced))
+        if pad:
+            del self._codes[-pad:]
+
+    def _swap_round(self, index, old, new):
+        self._untrack('played', old)
+        if self.won_round(index):
+            self._untrack('won', old)
+            self._track('won', new)
+        self._codes[index] = new.code
+        self._track('played', new)
+
+    def _win(self, index):
+        self._win_bits |= 1 << index
+        self.wins += 1
+        self.latest_win_round = max(self.latest_win_round, index)
+        self._track('won', Fighter.from_code(self._codes[index]))
+
+    def _unwin(self, index):
+        self._remove_win(index)
+        self._untrack('won', Fighter.from_code(self._codes[index]))
+
+    def _undo_round(self, index, code, won, removed):
+        if won:
+            self._unwin(index)
+        if removed:
+            self._pop_round(index)
+            self._untrack('played', Fighter.from_code(code))
+
+    def _redo_round(self, index, code, won, removed):
+        if removed:
+            fighter = Fighter.from_code(code)
+            self._insert_round(index, fighter)
+            self._track('played', fighter)
+        if won:
+            self._win(index)
@@ -0,0 +1,69 @@
+class GameRegistry:
+    """Live games, indexed by member, board message ID, channel ID, and guild ID."""
+    def __init__(self):
+        self.players = {}  # {member: Player}
+        self.messages = {}  # {message ID: Game}
+        self.channels = {}  # {channel ID: {Game}}
+        self.guilds = {}  # {guild ID: {Game}}
+        self._locations = {}  # {Game: (guild ID, channel ID, message ID)}
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __iter__(self):
+        return iter(self._locations)
+
+    def __contains__(self, game):
+        return game in self._locations
+
+    def by_message(self, message_id):
+        return self.messages.get(message_id)
+
+    def in_channel(self, channel_id):
+        return self.channels.get(channel_id, set())
+
+    def in_guild(self, guild_id):
+        return self.guilds.get(guild_id, set())
+
+    def add(self, game):
+        self.players.update(game.players)
+        self._index(game)
+
+    def add_players(self, players):
+        self.players.update(players)
+
+    def move(self, game):
+        """Reindex `game` after its board was reposted, possibly to a different channel."""
+        if game.channel is not None and self._locations.get(game) != self._location(game):
+            self._unindex(game)
+            self._index(game)
+
+    def remove(self, game):
+        for m in game.players:
+            self.players.pop(m, None)
+        self._unindex(game)
+
+    @staticmethod
+    def _location(game):
+        channel = game.channel
+        return channel.guild.id, channel.id, game.message.id
+
+    def _index(self, game):
+        if game.channel is None:
+            return
+        self._locations[game] = guild_id, channel_id, message_id = self._location(game)
+        self.messages[message_id] = game
+        self.guilds.setdefault(guild_id, set()).add(game)
+        self.channels.setdefault(channel_id, set()).add(game)
+
+    def _unindex(self, game):
+        try:
+            guild_id, channel_id, message_id = self._locations.pop(game)
+        except KeyError:
+            return
+        del self.messages[message_id]
+        for index, key in ((self.guilds, guild_id), (self.channels, channel_id)):
+            games = index[key]
+            games.discard(game)
+            if not games:
+                del index[key]
@@ -0,0 +1,82 @@
+import itertools
+import asyncio
+import logging
+import heapq
+
+
+class Deadlines:
+    """Call `callback(key)` once each key's deadline passes, using a single task for all keys.
+
+    Deadlines live in a dict, so pushing one back is only a write; the heap entry
+    still holding the old deadline is rescheduled lazily when it comes due.
+    """
+    def __init__(self, loop, callback):
+        self.loop = loop
+        self.callback = callback
+        self._deadlines = {}  # {key: deadline}
+        self._scheduled = {}  # {key: deadline of the heap entry responsible for key}
+        self._heap = []  # [(deadline, tiebreak, key)]
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        """Number of pending deadlines."""
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def set(self, key, delay):
+        """Set `key` to come due `delay` seconds from now, replacing any previous deadline."""
+        deadline = self.loop.time() + delay
+        self._deadlines[key] = deadline
+        scheduled = self._scheduled.get(key)
+        if scheduled is not None and scheduled <= deadline:
+            return
+        self._push(key, deadline)
+        if self._heap[0][2] is key:
+            self._wakeup.set()
+        if self._task is None:
+            self._task = self.loop.create_task(self._run())
+
+    def remove(self, key):
+        self._deadlines.pop(key, None)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _push(self, key, deadline):
+        self._scheduled[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+
+    def _pop_due(self, now):
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._scheduled.get(key) != deadline:
+                continue  # superseded by an earlier entry
+            current = self._deadlines.get(key)
+            if current is None:
+                del self._scheduled[key]
+            elif current > deadline:
+                self._push(key, current)
+            else:
+                del self._scheduled[key]
+                del self._deadlines[key]
+                yield key
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            for key in self._pop_due(self.loop.time()):
+                try:
+                    self.callback(key)
+                except Exception:
+                    logging.exception(f'Deadline callback failed for {key!r}.')
+            timeout = self._heap[0][0] - self.loop.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -8,39 +8,77 @@ import discord
 
 
 from .game import Game, EndReason
-from .fighter import Fighter, FakeFighter
+from .fighter import FakeFighter, roster
 from .modes import MODES
+from .registry import GameRegistry
 from .errors import SmashError
 
 
-FIGHTER_OPTIONS = [discord.SelectOption(label=fighter.name, emoji=fighter.emoji) for fighter in Fighter.all()]
-FIGHTER_OPTIONS = list(discord.utils.as_chunks(FIGHTER_OPTIONS, 22))
+FIGHTER_OPTIONS = [[discord.SelectOption.from_dict(option) for option in chunk] for chunk in roster['options']]
 RANDOM_FIGHTER = discord.SelectOption(label='random', emoji='\N{GAME DIE}')
 UNPLAYED_ROUND = discord.SelectOption(label='sit out', value='-', emoji='\N{CHAIR}')
 FIGHTER_OPTIONS[-1] += [RANDOM_FIGHTER, UNPLAYED_ROUND]
+ACTION_OPTIONS = [discord.SelectOption(label='Win', value='win', emoji='\N{PARTY POPPER}'),
+                  discord.SelectOption(label='Undo', value='undo', emoji='\N{LEFTWARDS ARROW WITH HOOK}\ufe0f'),
+                  *[discord.SelectOption(label='Change Winning Score - {}'.format(n or '\N{INFINITY}'),
+                                         value=f'change wins {n}', emoji='\N{CROWN}')
+                    for n in (0, 3, 5, 10)],
+                  *[discord.SelectOption(label=f'Change Ban Count - {n}',
+                                         value=f'change bans {n}', emoji='\N{HAMMER}')
+                    for n in (0, 1, 3)],
+                  *[discord.SelectOption(label=f'Change Mode - {m.name}', value=f'change mode {m.name}',
+                                         description=m.description, emoji='\N{NOTEBOOK WITH DECORATIVE COVER}')
+                    for m in MODES.values()],
+                  discord.SelectOption(label='Leave/Rejoin', value='active', emoji='\N{DOOR}'),
+                  discord.SelectOption(label='Vote to End', value='end', emoji='\N{CHEQUERED FLAG}')]
 
 
 class FakeContext:
-    def __init__(self, view: ui.View, interaction: discord.Interaction):
+    """Enough of a `commands.Context` to invoke game commands from an interaction."""
+    def __init__(self, interaction: discord.Interaction, player):
         self.author = interaction.user
         self.channel = self
 
         self.interaction = interaction
-        _, self.player = view.get_models(interaction)
+        self.player = player
+        self.replied = False
+
+    @classmethod
+    def from_view(cls, view: ui.View, interaction: discord.Interaction):
+        _, player = view.get_models(interaction)
+        return cls(interaction, player)
 
     async def send(self, *args, delete_after=None, **kwargs):
+        self.replied = True
+        if self.interaction.response.is_done():  # deferred while waiting for other commands
+            return await self.interaction.followup.send(*args, **kwargs, ephemeral=True)
         return await self.interaction.response.send_message(*args, **kwargs, ephemeral=True)
 
 
 class GameSelect(ui.Select):
     def get_command(self, command: str) -> Union[commands.Command, commands.Group]:
-        return self.view.game.context.bot.get_command(command)
+        return self.view.bot.get_command(command)
+
+    @staticmethod
+    def selected(interaction: discord.Interaction) -> str:
+        # read from the interaction, `self.values` is shared by every game using the view
+        return interaction.data['values'][0]
 
     async def callback(self, interaction: discord.Interaction):
+        game, _ = self.view.get_models(interaction)
+        if game is not None and game.busy:  # the command would wait for others, past Discord's deadline
+            await interaction.response.defer()
         try:
             await self._callback(interaction)
         except SmashError as err:
-            await interaction.response.send_message(str(err), ephemeral=True)
+            await FakeContext(interaction, None).send(str(err))
+            return
+        if not interaction.response.is_done():
+            game, _ = self.view.get_models(interaction)
+            if game is None:  # ended
+                await interaction.response.defer()
+            else:
+                await game.respond(interaction)
 
 
 class PickFighterMenu(GameSelect):
@@ -48,31 +86,18 @@ class PickFighterMenu(GameSelect):
         super().__init__(*args, placeholder=str(options[0]), options=options, **kwargs)
 
     async def _callback(self, interaction: discord.Interaction):
-        ctx = FakeContext(self.view, interaction)
+        ctx = FakeContext.from_view(self.view, interaction)
         cmd = self.get_command('pick')
-        await cmd(ctx, fighter=self.values[0])
+        await cmd(ctx, fighter=self.selected(interaction))
 
 
 class ActionMenu(GameSelect):
     def __init__(self, *args, **kwargs):
-        options = [discord.SelectOption(label='Win', value='win', emoji='\N{PARTY POPPER}'),
-                   discord.SelectOption(label='Undo', value='undo', emoji='\N{LEFTWARDS ARROW WITH HOOK}\ufe0f'),
-                   *[discord.SelectOption(label='Change Winning Score - {}'.format(n or '\N{INFINITY}'),
-                                          value=f'change wins {n}', emoji='\N{CROWN}')
-                     for n in (0, 3, 5, 10)],
-                   *[discord.SelectOption(label=f'Change Ban Count - {n}',
-                                          value=f'change bans {n}', emoji='\N{HAMMER}')
-                     for n in (0, 1, 3)],
-                   *[discord.SelectOption(label=f'Change Mode - {m.name}', value=f'change mode {m.name}',
-                                          description=m.description, emoji='\N{NOTEBOOK WITH DECORATIVE COVER}')
-                     for m in MODES.values()],
-                   discord.SelectOption(label='Leave/Rejoin', value='active', emoji='\N{DOOR}'),
-                   discord.SelectOption(label='Vote to End', value='end', emoji='\N{CHEQUERED FLAG}')]
-        super().__init__(*args, placeholder='\N{PUSHPIN} Actions', options=options, **kwargs)
+        super().__init__(*args, placeholder='\N{PUSHPIN} Actions', options=ACTION_OPTIONS, **kwargs)
 
     async def _callback(self, interaction: discord.Interaction):
-        ctx = FakeContext(self.view, interaction)
-        parts = self.values[0].split()
+        ctx = FakeContext.from_view(self.view, interaction)
+        parts = self.selected(interaction).split()
 
         if parts[0] == 'active':
             if ctx.player.active:
@@ -92,19 +117,74 @@ class ActionMenu(GameSelect):
             await cmd(ctx)
 
 
+class Components:
+    """The payload of a shared view's components, built once, to send on messages without binding the view.
+
+    discord.py dispatches a message's components to the view it was sent or edited with, ahead of views
+    added with `Client.add_view`, and keeps it until the view stops. Shared views are only added once,
+    and handle every message through their items' `custom_id`.
+    """
+    __slots__ = ('_components',)
+
+    def __init__(self, view: ui.View):
+        self._components = view.to_components()
+
+    def to_components(self):
+        return self._components
+
+    def __bool__(self):
+        return False  # discord.py only stores views that are truthy
+
 
 class GameView(ui.View):
-    def __init__(self, game: Game, *args, **kwargs):
-        self.game = game
+    """Persistent board components shared by every game.
+
+    Items are never changed after creation, so boards are sent with `Components` of this view.
+    Each item's `custom_id` names its action, and games are looked up from `games` by board message,
+    so boards keep working across restarts and reloads.
+    """
+    def __init__(self, games: GameRegistry, bot: commands.Bot, *args, **kwargs):
+        self.games = games
+        self.bot = bot
         super().__init__(*args, timeout=None, **kwargs)
 
         for row, options in enumerate(FIGHTER_OPTIONS):
-            self.add_item(PickFighterMenu(options=options, row=row))
+            self.add_item(PickFighterMenu(options=options, row=row, custom_id=f'smash:pick:{row}'))
 
-        self.add_item(ActionMenu())
+        self.add_item(ActionMenu(custom_id='smash:action'))
 
     def get_models(self, interaction: discord.Interaction):
-        return self.game, self.game.players[interaction.user]
+        game = self.games.by_message(interaction.message.id)
+        if game is None:
+            return None, None
+        return game, game.players.get(interaction.user)
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        _, player = self.get_models(interaction)
+        return player is not None
+
+
+class ActivityView(ui.View):
+    """Buttons for the inactivity confirmation, shared by every game.
+
+    `confirmations` maps the confirmation message's ID to its game.
+    """
+    def __init__(self, confirmations: dict[int, Game]):
+        super().__init__(timeout=None)
+        self.confirmations = confirmations
 
     async def interaction_check(self, interaction: discord.Interaction):
-        return interaction.user in self.game.players
\ No newline at end of file
+        game = self.confirmations.get(interaction.message.id)
+        return game is not None and interaction.user in game.players
+
+    @ui.button(label='Still playing', emoji='\N{WHITE HEAVY CHECK MARK}',
+               style=discord.ButtonStyle.green, custom_id='smash:activity:yes')
+    async def still_playing(self, interaction: discord.Interaction, button: ui.Button):
+        self.confirmations[interaction.message.id].confirm_activity(interaction.user, True)
+        await interaction.response.defer()
+
+    @ui.button(label='Vote to end', emoji='\N{CROSS MARK}',
+               style=discord.ButtonStyle.red, custom_id='smash:activity:no')
+    async def vote_to_end(self, interaction: discord.Interaction, button: ui.Button):
+        self.confirmations[interaction.message.id].confirm_activity(interaction.user, False)
+        await interaction.response.defer()
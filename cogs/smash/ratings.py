@@ -0,0 +1,137 @@
+"""Elo ratings of members, and of members playing each fighter, per guild.
+
+Each round is rated as the players who won it against the players who lost it: every
+player is compared with the mean rating of the other side, so a round costs O(players).
+See `round_deltas`.
+Ratings are applied when a game ends, since rounds can be undone until then.
+"""
+from itertools import islice, groupby
+
+from sortedcontainers import SortedList
+
+K = 32
+INITIAL = 1500.0
+OVERALL = ''  # fighter of a member's overall rating
+
+
+def expected(rating, opponent):
+    return 1 / (1 + 10 ** ((opponent - rating) / 400))
+
+
+def round_deltas(ratings, wins):
+    """Rating changes for one round, or `None` if nobody won or everybody did.
+
+    Winners gain by how unexpected their win was against the losers' mean rating, and
+    losers give up the total in proportion to how expected a win was for them, so
+    ratings are conserved.
+    """
+    winners = [r for r, win in zip(ratings, wins) if win]
+    losers = [r for r, win in zip(ratings, wins) if not win]
+    if not winners or not losers:
+        return None
+    won, lost = sum(winners) / len(winners), sum(losers) / len(losers)
+    odds = [expected(r, lost if win else won) for r, win in zip(ratings, wins)]
+    gained = sum(K * (1 - e) for e, win in zip(odds, wins) if win)
+    favored = sum(e for e, win in zip(odds, wins) if not win)
+    return [K * (1 - e) if win else -gained * e / favored for e, win in zip(odds, wins)]
+
+
+class Leaderboard:
+    """Ratings kept in rating order, so ranks and the top `n` are found in O(log n)."""
+    __slots__ = ('ratings', 'rounds', 'order')
+
+    def __init__(self):
+        self.ratings = {}  # {key: rating}
+        self.rounds = {}  # {key: rated rounds}
+        self.order = SortedList()  # [(-rating, key)]
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def get(self, key):
+        return self.ratings.get(key, INITIAL)
+
+    def set(self, key, rating, rounds):
+        old = self.ratings.get(key)
+        if old is not None:
+            self.order.remove((-old, key))
+        self.ratings[key] = rating
+        self.rounds[key] = rounds
+        self.order.add((-rating, key))
+
+    def rank(self, key):
+        """1-based rank of `key`, or `None` if it is unrated."""
+        rating = self.ratings.get(key)
+        if rating is None:
+            return None
+        return self.order.index((-rating, key)) + 1
+
+    def top(self, n):
+        """Return `(key, rating)` for the `n` highest rated keys."""
+        return [(key, -neg) for neg, key in islice(self.order, n)]
+
+
+class Ratings:
+    """Leaderboards of each guild, by member and by `(member, fighter)`."""
+    def __init__(self):
+        self.boards = {}  # {(guild ID, fighter or OVERALL): Leaderboard}
+
+    def board(self, guild_id, fighter=OVERALL):
+        try:
+            return self.boards[guild_id, fighter]
+        except KeyError:
+            board = self.boards[guild_id, fighter] = Leaderboard()
+            return board
+
+    def load(self, rows):
+        """Fill the leaderboards from `(guild, member, fighter, rating, rounds)` rows."""
+        for guild_id, member_id, fighter, rating, rounds in rows:
+            self.board(guild_id, fighter).set(member_id, rating, rounds)
+
+    def rows(self):
+        """Return every rating as a `(guild, member, fighter, rating, rounds)` row."""
+        return [(guild_id, member_id, fighter, rating, board.rounds[member_id])
+                for (guild_id, fighter), board in self.boards.items()
+                for member_id, rating in board.ratings.items()]
+
+    def rate_round(self, guild_id, results):
+        """Rate a round of `(member ID, fighter, win)`, returning the rows that changed."""
+        changed = self._rate(guild_id, results, {})
+        self.load(changed)
+        return changed
+
+    def rate_rounds(self, guild_id, rounds):
+        """Rate a game's rounds of `(member ID, fighter, win)` without changing the ratings.
+
+        Returns the rows that would change, to `load` once they're saved.
+        """
+        staged = {}  # {(guild, member, fighter): row}
+        for results in rounds:
+            staged.update((row[:3], row) for row in self._rate(guild_id, results, staged))
+        return list(staged.values())
+
+    def _rate(self, guild_id, results, staged):
+        """Rows rating one round, starting from the `staged` rows over the leaderboards."""
+        wins = [win for _, _, win in results]
+        changed = []
+        for fighters in ([OVERALL] * len(results), [fighter for _, fighter, _ in results]):
+            keys = [(guild_id, member_id, fighter) for (member_id, _, _), fighter in zip(results, fighters)]
+            rows = [staged.get(key) or self._row(*key) for key in keys]
+            deltas = round_deltas([row[3] for row in rows], wins)
+            if deltas is None:
+                break
+            changed.extend((*key, row[3] + delta, row[4] + 1) for key, row, delta in zip(keys, rows, deltas))
+        return changed
+
+    def _row(self, guild_id, member_id, fighter):
+        board = self.boards.get((guild_id, fighter))
+        if board is None:
+            return guild_id, member_id, fighter, INITIAL, 0
+        return guild_id, member_id, fighter, board.get(member_id), board.rounds.get(member_id, 0)
+
+def recompute(rounds):
+    """Rebuild every rating from `(guild, game, round, member, fighter, win)` rows in the order played."""
+    ratings = Ratings()
+    for (guild_id, _, _), results in groupby(rounds, key=lambda row: row[:3]):
+        ratings.rate_round(guild_id, [row[3:] for row in results])
+    return ratings
@@ -0,0 +1,105 @@
+"""Compile `data.py` into a precomputed roster artifact so startup doesn't redo the work.
+
+The artifact holds the fighter columns, the lookup tables `Fighter` searches, and the
+select option payloads for the fighter menus. It is rebuilt the first time the fighters
+are loaded after `data.py`, this module, or the functions building it change, so
+importing `cogs.smash` compiles it ahead of time.
+"""
+import hashlib
+import logging
+import inspect
+import pickle
+import os
+
+from .data import fighters as _fighters
+
+VERSION = 2
+OPTIONS_PER_MENU = 22  # leaves room for the random and sit out options in the last menu
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data.py')
+ROSTER_PATH = os.path.join(os.path.dirname(__file__), 'roster.pickle')
+
+
+def source_hash(*funcs):
+    """Hash of everything the roster is built from: `data.py`, this module and `funcs`."""
+    digest = hashlib.sha1()
+    for path in (DATA_PATH, __file__):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    for func in funcs:
+        digest.update(inspect.getsource(func).encode())
+    return digest.hexdigest()
+
+
+def compile_roster(find_ngrams, normalize, source=None):
+    """Build the roster from `data.fighters`, indexing names and aliases with `find_ngrams` and `normalize`.
+
+    Fighters are referred to by their index in the columns.
+    """
+    numbers, names, colors, emojis, aliases = [], [], [], [], []
+    postings = {}  # {ngram: [fighter]}
+    exact = {}  # {normalized name, alias, or number: fighter}
+    prefixes = {}  # {normalized name or alias: fighter}
+    for index, (number, name, color, emoji, *rest) in enumerate(_fighters):
+        fighter_aliases = tuple(rest[0]) if rest else ()
+        numbers.append(number)
+        names.append(name)
+        colors.append(color)
+        emojis.append(emoji)
+        aliases.append(fighter_aliases)
+        for ngram in find_ngrams(name).union(*(find_ngrams(a) for a in fighter_aliases)):
+            postings.setdefault(ngram, []).append(index)
+        for key in map(normalize, (name, *fighter_aliases)):
+            exact.setdefault(key, index)
+            prefixes.setdefault(key, index)
+        exact.setdefault(normalize(number), index)
+    prefix_keys = sorted(prefixes)
+    options = [{'label': name, 'value': name, 'default': False, 'emoji': {'name': emoji}}
+               for name, emoji in zip(names, emojis)]
+    return {
+        'version': VERSION,
+        'source': source,
+        'numbers': numbers,
+        'names': names,
+        'colors': colors,
+        'emojis': emojis,
+        'aliases': aliases,
+        'postings': postings,
+        'exact': exact,
+        'prefix_keys': prefix_keys,
+        'prefix_fighters': [prefixes[key] for key in prefix_keys],
+        'options': [options[i:i + OPTIONS_PER_MENU] for i in range(0, len(options), OPTIONS_PER_MENU)],
+    }
+
+
+def write_roster(roster):
+    tmp = f'{ROSTER_PATH}.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(roster, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, ROSTER_PATH)
+
+
+def load_roster(find_ngrams, normalize):
+    """Load the compiled roster, recompiling it if it's missing or out of date, see `source_hash`.
+
+    Falls back to compiling in memory if the artifact can't be read or written.
+    """
+    try:
+        source = source_hash(find_ngrams, normalize)
+    except OSError:
+        return compile_roster(find_ngrams, normalize)
+    try:
+        with open(ROSTER_PATH, 'rb') as f:
+            roster = pickle.load(f)
+        if roster['version'] == VERSION and roster['source'] == source:
+            return roster
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logging.exception('Failed to load compiled roster, recompiling.')
+    roster = compile_roster(find_ngrams, normalize, source)
+    try:
+        write_roster(roster)
+    except OSError:
+        logging.exception('Failed to write compiled roster.')
+    return roster
+
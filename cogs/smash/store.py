@@ -0,0 +1,139 @@
+"""Write-behind persistence of live games in SQLite.
+
+Games are marked dirty as they change and written together, in one transaction, every
+`interval` seconds. A game is saved as a small snapshot of where it is, rewritten only when
+it moves, and its log, of which only the entries added since the last write are appended.
+A burst of commands costs one transaction rather than one per command, and at most
+`interval` seconds of play are lost in a crash.
+"""
+import logging
+import sqlite3
+import json
+import os
+
+from .database import Database
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'games.sqlite3')
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS events (
+    game TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (game, seq)
+);
+'''
+SEPARATORS = (',', ':')
+
+
+class GameStore:
+    def __init__(self, loop, path=DB_PATH, interval=5):
+        self.loop = loop
+        self.db = Database(loop, path, SCHEMA)
+        self.interval = interval
+        self._dirty = {}  # {game ID: Game, or None to delete it}
+        self._saved = {}  # {game ID: (snapshot, log entries)} as last written
+        self._handle = None
+        self.marks = 0  # changes requested
+        self.transactions = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+
+    def __len__(self):
+        """Number of games waiting to be written."""
+        return len(self._dirty)
+
+    def mark(self, game):
+        """Save `game` with the next write."""
+        self.marks += 1
+        self._dirty[game.id] = game
+        self._schedule()
+
+    def remove(self, game):
+        """Delete `game` with the next write."""
+        self.discard(game.id)
+
+    def discard(self, game_id):
+        self.marks += 1
+        self._dirty[game_id] = None
+        self._schedule()
+
+    def _schedule(self):
+        if self._handle is None:
+            self._handle = self.loop.call_later(self.interval, self._flush_later)
+
+    def _flush_later(self):
+        self._handle = None
+        self.loop.create_task(self.flush())
+
+    def _snapshot(self):
+        """Take the rows to write for every marked game, and what is saved of each once they are."""
+        dirty, self._dirty = self._dirty, {}
+        rows = {'games': [], 'events': [], 'deleted': []}
+        saved = {}
+        for id_, game in dirty.items():
+            if game is None:
+                rows['deleted'].append((id_,))
+                self._saved.pop(id_, None)
+            elif game.message is not None:  # not posted yet, it will be marked again once it is
+                data, count = self._saved.get(id_, (None, 0))
+                snapshot = json.dumps(game.to_dict(), separators=SEPARATORS)
+                if snapshot != data:
+                    rows['games'].append((id_, snapshot))
+                entries = game.log_entries(count)
+                rows['events'].extend((id_, seq, json.dumps(entry, separators=SEPARATORS))
+                                      for seq, entry in enumerate(entries, count))
+                saved[id_] = (snapshot, count + len(entries))
+        return dirty, rows, saved
+
+    async def flush(self):
+        """Write every marked game now."""
+        dirty, rows, saved = self._snapshot()
+        if not any(rows.values()):
+            return
+        try:
+            await self.db.run(self._write, rows)
+        except sqlite3.Error:
+            logging.exception('Failed to save games, retrying later.')
+            self._dirty = {**dirty, **self._dirty}
+            self._schedule()
+        else:
+            self._saved.update(saved)
+
+    def _write(self, db, rows):
+        with db:
+            db.executemany('INSERT OR REPLACE INTO games VALUES (?, ?)', rows['games'])
+            db.executemany('INSERT OR REPLACE INTO events VALUES (?, ?, ?)', rows['events'])  # resent after a failed write
+            db.executemany('DELETE FROM events WHERE game = ?', rows['deleted'])
+            db.executemany('DELETE FROM games WHERE id = ?', rows['deleted'])
+        self.transactions += 1
+        self.rows_written += sum(map(len, rows.values()))
+        self.bytes_written += sum(len(row[-1]) for row in rows['games'] + rows['events'])
+
+    @staticmethod
+    def _read(db):
+        logs = {}
+        for game, data in db.execute('SELECT game, data FROM events ORDER BY game, seq'):
+            logs.setdefault(game, []).append(json.loads(data))
+        return [(id_, data, logs.get(id_, [])) for id_, data in db.execute('SELECT id, data FROM games')]
+
+    async def load(self):
+        """Return `(snapshot, log entries)` of every saved game, see `Game.to_dict` and `Game.log_entries`."""
+        games = []
+        for id_, data, entries in await self.db.run(self._read):
+            self._saved[id_] = (data, len(entries))
+            games.append((json.loads(data), entries))
+        return games
+
+    def close(self):
+        """Write anything pending and close the database, blocking until done."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        _, rows, _ = self._snapshot()
+        if any(rows.values()):
+            try:
+                self.db.run_sync(self._write, rows)
+            except sqlite3.Error:
+                logging.exception('Failed to save games.')
+        self.db.close()
@@ -14,13 +14,14 @@ import config
 Response = namedtuple('Response', 'status data')
 
 INTENTS = discord.Intents(members=True,  # priveleged
+                          message_content=True,  # priveleged
                           guilds=True,
                           messages=True,
                           reactions=True)
 
 
 class LagBot(commands.Bot):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, initial_cogs=(), **kwargs):
         super().__init__(*args,
                          command_prefix=commands.when_mentioned_or(config.prefix),
                          help_command=commands.DefaultHelpCommand(command_attrs={'hidden': True}),
@@ -29,20 +30,31 @@ class LagBot(commands.Bot):
                          intents=INTENTS,
                          **kwargs)
         self.exit_status = 0
+        self.initial_cogs = initial_cogs
+        self.http_ = None  # see `setup_hook`
+
+    async def setup_hook(self):
         useragent = 'Discord Bot'
         source = config.source
         if source is not None:
             useragent += ' ' + source
-        self.http_ = aiohttp.ClientSession(loop=self.loop, headers={'User-Agent': useragent})
+        self.http_ = aiohttp.ClientSession(headers={'User-Agent': useragent})
+
+        for cog in self.initial_cogs:
+            try:
+                await self.load_extension(cog)
+            except commands.ExtensionError:
+                logging.exception(f"Couldn't load cog {cog}")
 
     async def close(self):
         if self._closed:
             return
-        await self.http_.close()
+        if self.http_ is not None:
+            await self.http_.close()
         await super().close()
 
     def run(self, *args, **kwargs):
-        super().run(config.token, *args, **kwargs)
+        super().run(config.token, *args, log_handler=None, **kwargs)
         return self.exit_status
 
     async def on_ready(self):
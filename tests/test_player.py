@@ -0,0 +1,209 @@
+"""Check the incrementally maintained Player against a plain list of rounds.
+
+`ReferencePlayer` is the Player from before rounds were stored as codes and a win bitmap,
+with its counts, masks and pools recomputed from scratch. Every test runs with
+`Player.self_check` enabled, so each mutation also checks the player's own state.
+
+Run with `python -m unittest` from the repository root, with a config.py present.
+"""
+from collections import deque
+from types import SimpleNamespace
+import unittest
+import asyncio
+import random
+
+import discord
+
+from cogs.smash.models import Fighter, FakeFighter, Game, Player, MODES
+
+FAKES = [FakeFighter(name) for name in FakeFighter.names]
+STEPS = 200
+
+
+class ReferencePlayer:
+    """Rounds as a list of `[fighter, win]`, with bare `undo` restoring the state before the latest change."""
+    def __init__(self, max_bans):
+        self.rounds = []
+        self.bans = deque(maxlen=max_bans)
+        self.history = []  # rounds before each undoable change
+
+    def _save(self):
+        self.history.append([round_[:] for round_ in self.rounds])
+
+    @property
+    def wins(self):
+        return sum(win for _, win in self.rounds)
+
+    @property
+    def latest_win_round(self):
+        return max((ind for ind, (_, win) in enumerate(self.rounds) if win), default=-1)
+
+    def strings(self):
+        return ['{1}{0}{1}'.format(fighter, '__' if win else '') for fighter, win in self.rounds]
+
+    def play(self, fighter, round_num=None):
+        self._save()
+        if round_num is None:
+            self.rounds.append([fighter, False])
+            return
+        round_diff = round_num - (len(self.rounds) - 1)
+        if round_diff > 0:
+            self.rounds.extend([FakeFighter('-'), False] for _ in range(round_diff))
+        if self.rounds[round_num][0].replace_on_insert:
+            self.rounds[round_num][0] = fighter
+        else:
+            self.rounds.insert(round_num, [fighter, False])
+
+    def win(self, round_num=None):
+        if round_num is None:
+            round_num = len(self.rounds) - 1
+        try:
+            round_ = self.rounds[round_num]
+        except IndexError:
+            return False
+        if round_[1]:
+            return False
+        self._save()
+        round_[1] = True
+        return True
+
+    def undo(self, remove_action=None, round_num=None):
+        if round_num is None:
+            if not self.history:
+                return False
+            self.rounds = self.history.pop()
+            return True
+        try:
+            round_ = self.rounds[round_num]
+        except IndexError:
+            return False
+        if not round_[1] and remove_action != 'play':
+            return False
+        self._save()
+        if remove_action == 'play':
+            self.rounds.pop(round_num)
+        else:
+            round_[1] = False
+        return True
+
+
+class PlayerTest(unittest.TestCase):
+    def setUp(self):
+        Player.self_check = True
+        self.loop = asyncio.new_event_loop()
+        self.fighters = list(Fighter.all())
+
+    def tearDown(self):
+        Player.self_check = False
+        self.loop.close()
+
+    def make_game(self, mode, players, max_bans):
+        cog = SimpleNamespace(bot=SimpleNamespace(loop=self.loop))
+        members = [discord.Object(id_) for id_ in range(1, players + 1)]
+        return Game(cog, None, MODES[mode], members, 0, max_bans, None)
+
+    def step(self, rng, player, reference):
+        """Apply one random action to both players, returning its description."""
+        action = rng.choice(['play', 'play', 'insert', 'pad', 'win', 'win round', 'undo', 'undo round',
+                             'undo play', 'ban', 'unban'])
+        size = len(reference.rounds)
+        if action == 'play':
+            args = (rng.choice(self.fighters + FAKES),)
+        elif action == 'insert':
+            if not size:
+                return None
+            args = (rng.choice(self.fighters), rng.choice([rng.randrange(size), -1]))
+        elif action == 'pad':
+            args = (rng.choice(self.fighters), size + rng.randrange(3))
+        elif action == 'win':
+            args = ()
+        elif action == 'win round':
+            args = (rng.randrange(size + 1),)
+        elif action == 'undo':
+            args = ()
+        elif action == 'undo round':
+            args = (None, rng.randrange(size + 1))
+        elif action == 'undo play':
+            args = ('play', rng.randrange(size + 1))
+        elif action == 'ban':
+            unbanned = [f for f in self.fighters if f not in reference.bans]
+            fighter = rng.choice(unbanned)
+            player.ban(fighter)
+            reference.bans.append(fighter)
+            return f'ban {fighter}'
+        else:
+            if not reference.bans:
+                return None
+            fighter = rng.choice(list(reference.bans))
+            player.unban(fighter)
+            reference.bans.remove(fighter)
+            return f'unban {fighter}'
+        name = action.split()[0]
+        if name == 'insert' or name == 'pad':
+            name = 'play'
+        result = getattr(player, name)(*args)
+        expected = getattr(reference, name)(*args)
+        if name != 'play':
+            self.assertEqual(result, expected, (action, args))
+        return f'{action} {args}'
+
+    def assert_matches(self, game, references, actions):
+        for player, reference in zip(game.player_list, references):
+            self.assertEqual([str(r) for r in player.rounds], reference.strings(), actions)
+            self.assertEqual(player.wins, reference.wins, actions)
+            self.assertEqual(player.latest_win_round, reference.latest_win_round, actions)
+            self.assertEqual(list(player.bans), list(reference.bans), actions)
+        for fighter in self.fighters:
+            players = [r for r in references if any(f is fighter for f, _ in r.rounds)]
+            self.assertEqual(fighter in game.played, bool(players), (fighter, actions))
+            banned = any(fighter in r.bans for r in references)
+            self.assertEqual(fighter in game.banned, banned, (fighter, actions))
+            for player in game.player_list:
+                allowed = bool(game.mode.pick_check(player, fighter))
+                self.assertEqual(fighter in player.eligible, allowed, (fighter, actions))
+
+    def run_sequence(self, seed, mode, max_bans):
+        rng = random.Random(seed)
+        game = self.make_game(mode, rng.randint(1, 3), max_bans)
+        references = [ReferencePlayer(max_bans) for _ in game.player_list]
+        actions = []
+        for _ in range(STEPS):
+            index = rng.randrange(len(references))
+            action = self.step(rng, game.player_list[index], references[index])
+            if action is not None:
+                actions.append(f'{index}: {action}')
+                self.assert_matches(game, references, actions[-10:])
+        return game
+
+    def test_mixed_sequences(self):
+        for seed in range(6):
+            for mode in MODES:
+                for max_bans in (None, 0, 2):
+                    with self.subTest(seed=seed, mode=mode, max_bans=max_bans):
+                        self.run_sequence(seed, mode, max_bans)
+
+    def test_replay(self):
+        for seed in range(10):
+            with self.subTest(seed=seed):
+                game = self.run_sequence(seed, 'smash', 3)
+                members = {player.member.id: player.member for player in game.player_list}
+                replayed = Game.replay(game.cog, game.log, members)
+                self.assertEqual(replayed.log, game.log)
+                for player, copy in zip(game.player_list, replayed.player_list):
+                    self.assertEqual(list(copy.rounds), list(player.rounds))
+                    self.assertEqual(list(copy.bans), list(player.bans))
+                    self.assertEqual(copy.history, player.history)
+
+    def test_limit_bans(self):
+        game = self.make_game('smash', 2, None)
+        player = game.player_list[0]
+        for fighter in self.fighters[:5]:
+            player.ban(fighter)
+        game.max_bans = 2
+        self.assertEqual(list(player.bans), self.fighters[3:5])
+        self.assertNotIn(self.fighters[0], game.banned)
+        self.assertIn(self.fighters[4], game.banned)
+
+
+if __name__ == '__main__':
+    unittest.main()